@@ -0,0 +1,94 @@
+"""
+ORM vs Core read path for the chain endpoints.
+
+    python bench/chain_read_bench.py [blocks] [runs]
+
+Fills an in-memory SQLite ledger (one long loan plus many short ones) and,
+for a single-loan chain and the full ledger, serializes every block twice:
+through Block ORM instances (the old loan_chain/full_chain code) and through
+chain_read_service's Core rows. Reports median wall time and the peak Python
+allocation (tracemalloc) of each.
+"""
+import datetime
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_URI"] = "sqlite://"
+
+from app import create_app  # noqa: E402
+from db import db  # noqa: E402
+
+
+def fill(blocks: int, long_chain: int):
+    import models.agent  # noqa: F401  (blocks.agent_id references it)
+    from models.bank import Bank
+    from models.block import Block
+    from models.user import User
+    db.create_all()
+    db.session.add(User(id=1, user_name="bench", password_hash="-", salt=b"-"))
+    db.session.add(Bank(id=1, bank_id="bench", bank_name="Bench Bank", bank_password_hash="-", salt=b"-"))
+    t0 = datetime.datetime(2025, 1, 1)
+    rows, prev = [], "0" * 64
+    for i in range(blocks):
+        loan = "long" if i < long_chain else f"loan-{i // 5:06d}"
+        if i == long_chain or (i > long_chain and i % 5 == 0):
+            prev = "0" * 64
+        cur = f"{i + 1:064x}"
+        rows.append(dict(loan_id=loan, user_id=1, bank_id=1, metadata_ciphertext="x" * 200, metadata_nonce=b"n" * 12,
+                         transaction_data="paid", previous_hash=prev, current_hash=cur, bank_name_public="Bench Bank",
+                         created_at=t0 + datetime.timedelta(seconds=i), updated_at=t0))
+        prev = cur
+    db.session.execute(Block.__table__.insert(), rows)
+    db.session.commit()
+
+
+def measure(fn, runs: int):
+    times = []
+    for _ in range(runs):
+        db.session.expunge_all()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    long_chain = min(2_000, blocks)
+    app = create_app()
+    with app.app_context():
+        from models.block import Block
+        from routes.loan_routes import serialize_block
+        from services.chain_read_service import iter_full_chain, iter_loan_chain
+        fill(blocks, long_chain)
+
+        cases = {
+            f"loan chain ({long_chain} blocks)": (
+                lambda: [serialize_block(b) for b in Block.query.filter_by(loan_id="long").order_by(Block.created_at.asc()).all()],
+                lambda: [serialize_block(b) for b in iter_loan_chain("long")],
+            ),
+            # the Core path streams, so only one block's dict is alive at a time
+            f"full chain ({blocks} blocks)": (
+                lambda: [serialize_block(b) for b in Block.query.order_by(Block.created_at.asc()).all()],
+                lambda: sum(1 for b in iter_full_chain() if serialize_block(b)),
+            ),
+        }
+        print(f"{'case':<28} {'path':<5} {'median ms':>10} {'peak KiB':>10}")
+        for name, (orm, core) in cases.items():
+            for label, fn in (("orm", orm), ("core", core)):
+                t, peak = measure(fn, runs)
+                print(f"{name:<28} {label:<5} {t * 1000:>10.1f} {peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Size and CPU trade-off of metadata compression before encryption.
+
+    python bench/compression_bench.py [iterations]
+
+Builds representative loan-application payloads (small form, typical
+application, large package with repeated schedule rows and an embedded
+base64 document) and reports, per codec: stored size (the base64 text that
+lands in blockchain_blocks.metadata_ciphertext) and encrypt/decrypt time.
+"""
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.encryption_service import encrypt_json_with_dek, decrypt_json_with_dek  # noqa: E402
+
+
+def applicant(rng: random.Random) -> dict:
+    return {
+        "fullName": f"Applicant {rng.randint(1000, 9999)}",
+        "dateOfBirth": f"19{rng.randint(50, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "address": {"line1": f"{rng.randint(1, 999)} Main Street", "city": "Hyderabad", "state": "Telangana", "pin": str(rng.randint(500000, 509999))},
+        "employment": {"employer": "Acme Industries Pvt Ltd", "designation": "Senior Engineer", "monthlyIncome": rng.randint(30_000, 300_000), "yearsEmployed": rng.randint(0, 30)},
+        "pan": "ABCDE%04dF" % rng.randint(0, 9999),
+    }
+
+
+def payloads(rng: random.Random) -> dict:
+    small = {"loanType": "personal", "amount": 250000, "tenureMonths": 24, "applicant": applicant(rng)}
+    typical = {**small, "coApplicants": [applicant(rng) for _ in range(2)],
+               "references": [{"name": f"Ref {i}", "phone": f"98{rng.randint(10**7, 10**8 - 1)}", "relation": "friend"} for i in range(4)],
+               "bankStatements": [{"month": f"2025-{m:02d}", "credits": rng.randint(50_000, 200_000), "debits": rng.randint(20_000, 150_000)} for m in range(1, 13)]}
+    schedule = [{"installment": i, "dueDate": f"2026-{(i % 12) + 1:02d}-05", "principal": round(rng.uniform(5000, 9000), 2), "interest": round(rng.uniform(500, 2500), 2), "status": "scheduled"} for i in range(1, 241)]
+    document = base64.b64encode(rng.randbytes(256 * 1024)).decode()  # already-compressed scan
+    large = {**typical, "repaymentSchedule": schedule, "documents": [{"name": "salary-slip.pdf", "contentBase64": document}]}
+    return {"small": small, "typical": typical, "large": large}
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = random.Random(42)
+    dek = os.urandom(32)
+    codecs = ["none", "zlib"]
+    try:
+        import zstandard  # noqa: F401
+        codecs.append("zstd")
+    except ImportError:
+        print("(zstandard not installed; skipping zstd)")
+
+    print(f"{'payload':<8} {'codec':<5} {'json B':>9} {'stored B':>9} {'ratio':>6} {'enc us':>9} {'dec us':>9}")
+    for name, doc in payloads(rng).items():
+        text = json.dumps(doc)
+        for codec in codecs:
+            enc_t, dec_t = [], []
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                stored, nonce = encrypt_json_with_dek(text, dek, codec=codec)
+                t1 = time.perf_counter()
+                assert decrypt_json_with_dek(stored, nonce, dek) == text
+                t2 = time.perf_counter()
+                enc_t.append(t1 - t0)
+                dec_t.append(t2 - t1)
+            print(f"{name:<8} {codec:<5} {len(text):>9} {len(stored):>9} {len(stored) / len(text):>6.2f} "
+                  f"{statistics.median(enc_t) * 1e6:>9.0f} {statistics.median(dec_t) * 1e6:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
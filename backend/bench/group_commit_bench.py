@@ -0,0 +1,38 @@
+"""
+Append throughput with and without group commit against the writer count.
+
+    python bench/group_commit_bench.py [thread counts, e.g. 1,4,16,32] [appends per thread]
+                                       [commit latency ms]
+
+Runs shard_bench's workload on one shard from a single process: `threads`
+threads append status blocks to random loans through append_status_block,
+first with one commit per append (GROUP_COMMIT_ENABLED=0), then through the
+group committer (GROUP_COMMIT_ENABLED=1, default window and batch size).
+
+As in shard_bench, every commit sleeps `commit latency` ms while holding the
+database's write lock, standing in for fsync. Without group commit the
+appends/s stay near 1000 / latency whatever the thread count; with it, one
+commit carries every append queued during the previous one, so throughput
+grows with the number of concurrent writers until GROUP_COMMIT_MAX_BATCH
+or until the leader, which runs the batch's items one after another, is
+CPU-bound (compare a run with a latency of 0).
+"""
+import sys
+
+from shard_bench import run
+
+
+def main():
+    counts = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,4,16,32").split(",")]
+    per_thread = sys.argv[2] if len(sys.argv) > 2 else "20"
+    latency_ms = sys.argv[3] if len(sys.argv) > 3 else "20"
+    print(f"1 shard, 1 process, {latency_ms} ms per commit")
+    print(f"{'threads':>7} {'off appends/s':>14} {'on appends/s':>13} {'speed-up':>9} {'failed':>7}")
+    for n in counts:
+        off, failed_off = run(1, str(n), per_thread, 1, latency_ms)
+        on, failed_on = run(1, str(n), per_thread, 1, latency_ms, group_commit=True)
+        print(f"{n:>7} {off:>14.0f} {on:>13.0f} {on / off:>8.2f}x {failed_off + failed_on:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Append throughput of the hash-sharded ledger against the shard count.
+
+    python bench/shard_bench.py [shard counts, e.g. 1,2,4] [threads] [appends per thread]
+                                [processes] [commit latency ms]
+
+For each shard count, a fresh set of SQLite files in a temporary directory
+(the first is the primary) gets a synthetic ledger from generate_ledger.
+Then `processes` worker interpreters, each with `threads` threads, append
+status blocks to random loans through append_status_block, one commit each
+(group commit off), and the run reports appends per second across all of
+them.
+
+Every write transaction starts with BEGIN IMMEDIATE, so it holds its
+database's write lock from the first statement to COMMIT, and each commit
+first sleeps `commit latency` ms inside that lock. That stands in for the
+fsync or replication round trip of a production database: a database
+commits one append at a time, and adding shards is the only way to run more
+commits at once. With a latency of 0 the run measures the CPU-bound case
+(SQLite's own fsync on this storage) instead.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = r"""
+import sys, time
+from sqlalchemy import event
+from app import create_app
+from config import Config
+from db import db
+
+class BenchConfig(Config):
+    # pysqlite's own transaction handling off, so "begin" below can emit
+    # BEGIN IMMEDIATE; writers queue on the busy timeout instead of failing
+    SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"isolation_level": None, "timeout": 60}}
+
+def install_commit_latency(app, latency):
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "begin", lambda conn: conn.exec_driver_sql("BEGIN IMMEDIATE"))
+            if latency:
+                event.listen(engine, "commit", lambda conn: time.sleep(latency))
+
+app = create_app(BenchConfig)
+"""
+
+SETUP = APP + r"""
+install_commit_latency(app, 0)
+with app.app_context():
+    app.test_cli_runner().invoke(args=["init-db"])
+    from services.synthetic_ledger_service import ChainShape, generate_ledger
+    generate_ledger(50, 5, 0, 2000, ChainShape(), kdf_iterations=1000, seed=7)
+"""
+
+WORKER = APP + r"""
+import random, threading
+threads, per_thread, seed = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+latency, start_at = float(sys.argv[4]) / 1000, float(sys.argv[5])
+with app.app_context():
+    from models.loan_head import LoanHead
+    from utils.sharding import shard_indexes, use_shard
+    loan_ids = []
+    for shard in shard_indexes():
+        with use_shard(shard):
+            loan_ids += [l for (l,) in db.session.query(LoanHead.loan_id)]
+    db.session.remove()
+install_commit_latency(app, latency)
+failed = []
+
+def worker(seed):
+    rng = random.Random(seed)
+    with app.app_context():
+        from services.blockchain_service import append_status_block
+        for _ in range(per_thread):
+            try:
+                append_status_block(rng.choice(loan_ids), "paid")
+            except Exception:
+                db.session.rollback()
+                failed.append(1)
+
+ts = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+time.sleep(max(0.0, start_at - time.time()))
+t0 = time.time()
+[t.start() for t in ts]
+[t.join() for t in ts]
+print(t0, time.time(), threads * per_thread - len(failed), len(failed))
+"""
+
+
+def run(n, threads, per_thread, processes, latency_ms, group_commit=False):
+    """Appends/s and failed appends of all workers against n shards."""
+    with tempfile.TemporaryDirectory() as tmp:
+        uris = [f"sqlite:///{os.path.join(tmp, f'shard{i}.db')}" for i in range(n)]
+        env = dict(os.environ, DB_URI=uris[0], LEDGER_SHARD_URIS=",".join(uris[1:]),
+                   GROUP_COMMIT_ENABLED="1" if group_commit else "0", KDF_ITERATIONS="1000")
+        subprocess.run([sys.executable, "-c", SETUP], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+
+        # start together once every interpreter has imported the app
+        start_at = str(time.time() + 2 + 0.5 * processes)
+        workers = [subprocess.Popen([sys.executable, "-c", WORKER, threads, per_thread, str(i), latency_ms, start_at],
+                                    cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, text=True)
+                   for i in range(processes)]
+        results = []
+        for w in workers:
+            out, _ = w.communicate()
+            if w.returncode:
+                raise subprocess.CalledProcessError(w.returncode, w.args, out)
+            results.append([float(v) for v in out.split()[-4:]])
+
+    elapsed = max(r[1] for r in results) - min(r[0] for r in results)
+    return sum(r[2] for r in results) / elapsed, int(sum(r[3] for r in results))
+
+
+def main():
+    counts = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4").split(",")]
+    threads = sys.argv[2] if len(sys.argv) > 2 else "4"
+    per_thread = sys.argv[3] if len(sys.argv) > 3 else "25"
+    processes = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    latency_ms = sys.argv[5] if len(sys.argv) > 5 else "20"
+    base = None
+    print(f"{processes} processes x {threads} threads, {latency_ms} ms per commit")
+    print(f"{'shards':>6} {'appends/s':>10} {'speed-up':>9} {'failed':>7}")
+    for n in counts:
+        rate, failed = run(n, threads, per_thread, processes, latency_ms)
+        base = base or rate
+        print(f"{n:>6} {rate:>10.0f} {rate / base:>8.2f}x {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Measure cold-start cost of the backend: a fresh interpreter importing the app
+and calling create_app(), repeated N times.
+
+    python bench/startup_bench.py [runs]
+
+Also reports whether crypto modules were pulled in during start-up (they should
+not be; they load on first use).
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import sys, time
+t0 = time.perf_counter()
+from app import create_app
+create_app()
+t1 = time.perf_counter()
+heavy = [m for m in ("cryptography", "bcrypt", "jwt") if m in sys.modules]
+print(f"{(t1 - t0) * 1000:.2f} {','.join(heavy) or '-'}")
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = dict(os.environ, DB_URI=os.getenv("DB_URI", "sqlite://"))
+    timings, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(out[0]))
+        if out[1] != "-":
+            heavy.update(out[1].split(","))
+
+    print(f"create_app() cold start over {runs} runs")
+    print(f"  median {statistics.median(timings):.1f} ms  min {min(timings):.1f} ms  max {max(timings):.1f} ms")
+    print(f"  heavy modules loaded at start-up: {', '.join(sorted(heavy)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
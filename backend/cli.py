@@ -0,0 +1,146 @@
+import click
+from flask import Flask
+from utils.sharding import create_ledger_tables, shard_indexes, use_shard
+from db import db
+
+def register_commands(app: Flask):
+    @app.cli.command("init-db")
+    def init_db():
+        """Create all tables (run once per environment, not at start-up)."""
+        # Import every model so its table is registered on db.metadata
+        import models.user, models.bank, models.agent, models.block, models.encrypted_key, models.loan_head, models.loan_stats, models.metadata_chunk, models.archived_loan, models.key_rotation  # noqa: F401
+        # only the primary's metadata: Flask-SQLAlchemy keeps (empty) metadata
+        # for every bind key it has seen, and the shards get theirs below
+        db.create_all(bind_key=None)
+        for shard in shard_indexes()[1:]:
+            create_ledger_tables(shard)
+        click.echo("Database tables created.")
+        # blocks written before loan_heads existed are invisible to appends
+        # and search until the heads are backfilled
+        from models.block import Block
+        from models.loan_head import LoanHead
+        for shard in shard_indexes():
+            with use_shard(shard):
+                headless = db.session.query(Block.loan_id).filter(
+                    ~db.session.query(LoanHead.loan_id).filter(LoanHead.loan_id == Block.loan_id).exists()
+                ).first()
+            if headless:
+                click.echo("Warning: loans without a loan_heads row exist (e.g. loan "
+                           f"{headless[0]}); run `flask rebuild-stats` to backfill them.", err=True)
+                break
+
+    @app.cli.command("rebuild-loan-heads")
+    @click.option("--batch-size", default=5000, show_default=True)
+    def rebuild_loan_heads_cmd(batch_size):
+        """Recompute loan_heads (search index) from the block chains."""
+        from services.loan_search_service import rebuild_loan_heads
+        written = 0
+        for shard in shard_indexes():
+            with use_shard(shard):
+                written += rebuild_loan_heads(batch_size)
+        click.echo(f"Rebuilt {written} loan heads.")
+
+    @app.cli.command("rebuild-stats")
+    @click.option("--skip-heads", is_flag=True, help="Trust the current loan_heads instead of rebuilding them first.")
+    def rebuild_stats_cmd(skip_heads):
+        """Recompute portfolio counters (/stats) from the block chains."""
+        from services.loan_search_service import rebuild_loan_heads
+        from services.stats_service import rebuild_stats
+        for shard in shard_indexes():
+            with use_shard(shard):
+                if not skip_heads:
+                    rebuild_loan_heads()
+                rebuild_stats()
+        click.echo("Portfolio statistics rebuilt.")
+
+    @app.cli.command("generate-ledger")
+    @click.option("--loans", default=10_000, show_default=True)
+    @click.option("--users", default=None, type=int, help="Default: loans / 5.")
+    @click.option("--banks", default=20, show_default=True)
+    @click.option("--agents", default=50, show_default=True)
+    @click.option("--days", default=365, show_default=True, help="Spread initiation times over this many past days.")
+    @click.option("--accept-rate", default=0.85, show_default=True)
+    @click.option("--mean-payments", default=6.0, show_default=True, help="Mean paid/unpaid blocks per accepted loan.")
+    @click.option("--unpaid-rate", default=0.1, show_default=True)
+    @click.option("--complete-rate", default=0.5, show_default=True)
+    @click.option("--close-rate", default=0.6, show_default=True, help="Share of completed loans that get closed.")
+    @click.option("--password", default="password", show_default=True, help="Password for every generated user and bank.")
+    @click.option("--fast-kdf", is_flag=True, help="Derive wrapping keys with 1000 PBKDF2 iterations (serve with KDF_ITERATIONS=1000).")
+    @click.option("--batch-size", default=2000, show_default=True, help="Loans per bulk insert / commit.")
+    @click.option("--seed", default=None, type=int)
+    @click.option("--prefix", default=None, help="Name prefix for generated parties (default: random).")
+    def generate_ledger_cmd(loans, users, banks, agents, days, accept_rate, mean_payments, unpaid_rate,
+                            complete_rate, close_rate, password, fast_kdf, batch_size, seed, prefix):
+        """Bulk-generate a synthetic ledger for scale testing."""
+        from services.synthetic_ledger_service import ChainShape, generate_ledger
+        from services.stats_service import rebuild_stats
+
+        users = users or max(1, loans // 5)
+        if users < 1 or banks < 1:
+            raise click.BadParameter("need at least one user and one bank")
+        shape = ChainShape(accept_rate, mean_payments, unpaid_rate, complete_rate, close_rate)
+
+        def progress(done, total, blocks):
+            click.echo(f"  {done}/{total} loans, {blocks} blocks")
+
+        summary = generate_ledger(users, banks, agents, loans, shape, days=days, password=password,
+                                  kdf_iterations=1000 if fast_kdf else None, seed=seed,
+                                  batch_size=batch_size, prefix=prefix, progress=progress)
+        for shard in shard_indexes():
+            with use_shard(shard):
+                rebuild_stats()
+        click.echo(f"Generated {summary}")
+        if fast_kdf:
+            click.echo("Wrapping keys use 1000 PBKDF2 iterations: run the server with KDF_ITERATIONS=1000 to decrypt.")
+
+    @app.cli.command("detect-forks")
+    @click.option("--limit", default=1000, show_default=True)
+    def detect_forks_cmd(limit):
+        """Report forked chains; exits with status 1 if any are found."""
+        import json
+        from services.chain_integrity_service import detect_forks
+        forks = []
+        for shard in shard_indexes():
+            with use_shard(shard):
+                forks += detect_forks(limit)
+        for fork in forks:
+            click.echo(json.dumps(fork))
+        click.echo(f"{len(forks)} fork(s) found.")
+        if forks:
+            raise SystemExit(1)
+
+    @app.cli.command("archive-loans")
+    @click.option("--min-age-days", type=float, default=None, help="Defaults to ARCHIVE_MIN_AGE_DAYS.")
+    @click.option("--batch-size", default=500, show_default=True)
+    @click.option("--limit", type=int, default=None, help="Stop after archiving this many loans.")
+    def archive_loans_cmd(min_age_days, batch_size, limit):
+        """Move finished (closed) chains into the archived_loans tier."""
+        from services.archive_service import archive_finished_loans
+        if min_age_days is None:
+            min_age_days = app.config["ARCHIVE_MIN_AGE_DAYS"]
+        archived, skipped = 0, {}
+        for shard in shard_indexes():
+            with use_shard(shard):
+                result = archive_finished_loans(min_age_days, batch_size, None if limit is None else limit - archived)
+            archived += result["archived"]
+            skipped.update(result["skipped"])
+            if limit is not None and archived >= limit:
+                break
+        for loan_id, reason in skipped.items():
+            click.echo(f"skipped {loan_id}: {reason}")
+        click.echo(f"Archived {archived} loans, skipped {len(skipped)}.")
+
+    @app.cli.command("verify-archive")
+    @click.option("--rehash", is_flag=True, help="Also recompute every block hash with APP_HASH_SALT.")
+    def verify_archive_cmd(rehash):
+        """Check archived chains against their summaries; exits with status 1 on failure."""
+        from services.archive_service import verify_archives
+        failed = 0
+        for shard in shard_indexes():
+            with use_shard(shard):
+                for loan_id, problems in verify_archives(app.config["APP_HASH_SALT"] if rehash else None):
+                    failed += 1
+                    click.echo(f"{loan_id}: {'; '.join(problems)}")
+        click.echo(f"{failed} archived loan(s) failed verification.")
+        if failed:
+            raise SystemExit(1)
@@ -1,3 +1,4 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.mysql import MEDIUMTEXT
-db = SQLAlchemy()
\ No newline at end of file
+from utils.sharding import ShardedSession
+
+db = SQLAlchemy(session_options={"class_": ShardedSession})
@@ -0,0 +1,31 @@
+from datetime import datetime
+from sqlalchemy.dialects.mysql import LONGBLOB
+from db import db
+
+class ArchivedLoan(db.Model):
+    """
+    Cold tier for finished chains: every block of the loan, compressed into
+    one payload, plus a summary that is checked against the live chain before
+    its blocks are removed. See services/archive_service.py.
+    """
+    __tablename__ = 'archived_loans'
+    loan_id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), nullable=False, index=True)
+    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'), nullable=True)
+
+    # Verified summary
+    genesis_block_id = db.Column(db.Integer, nullable=False)
+    genesis_hash = db.Column(db.String(64), nullable=False)
+    final_hash = db.Column(db.String(64), nullable=False)
+    final_status = db.Column(db.String(32), nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    initiated_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=False)
+
+    # zlib-compressed JSON array of the blocks, oldest first
+    codec = db.Column(db.String(16), nullable=False)
+    payload = db.Column(db.LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False)
+    payload_sha256 = db.Column(db.String(64), nullable=False)
+
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
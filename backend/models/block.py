@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from db import db
 
 class Block(db.Model):
@@ -9,13 +10,21 @@ class Block(db.Model):
     bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), nullable=False)
     agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'), nullable=True)
 
-    metadata_ciphertext = db.Column(db.MEDIUMTEXT, nullable=False)  # base64 text
+    # Encrypted metadata JSON (base64 text)
+    metadata_ciphertext = db.Column(db.Text().with_variant(MEDIUMTEXT, 'mysql'), nullable=False)
     metadata_nonce = db.Column(db.LargeBinary, nullable=False)
 
-    transaction_data = db.Column(db.String(32), nullable=False)
-    previous_hash = db.Column(db.String(64), nullable=False)
-    current_hash = db.Column(db.String(64), nullable=False)
+    transaction_data = db.Column(db.String(32), nullable=False)  # initiated/accepted/paid/unpaid/completed/closed
+    previous_hash = db.Column(db.String(64), nullable=False)  # SHA-256 hex
+    current_hash = db.Column(db.String(64), nullable=False)  # SHA-256 hex
+
+    # Public-only display (verification demo)
     bank_name_public = db.Column(db.String(120), nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # A block can have only one successor: two blocks sharing a parent is a fork
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'previous_hash', name='uq_blocks_loan_previous_hash'),
+    )
@@ -6,10 +6,11 @@ class EncryptedKey(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     loan_id = db.Column(db.String(64), unique=True, nullable=False)
 
+    # DEK (data-encryption key) encrypted for user & bank
     dek_cipher_for_user = db.Column(db.LargeBinary, nullable=False)
     dek_nonce_for_user = db.Column(db.LargeBinary, nullable=False)
 
     dek_cipher_for_bank = db.Column(db.LargeBinary, nullable=False)
     dek_nonce_for_bank = db.Column(db.LargeBinary, nullable=False)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
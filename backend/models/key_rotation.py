@@ -0,0 +1,15 @@
+from db import db
+
+class KeyRotation(db.Model):
+    """
+    Marker for a password rotation in progress (one per user or bank).
+    While it is fresh, new loans of that party are refused, so none can be
+    wrapped with the old password after the rotation has passed them by.
+    """
+    __tablename__ = 'key_rotations'
+    party = db.Column(db.String(8), primary_key=True)  # "user" or "bank"
+    party_id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    # Refreshed after every batch; a marker not refreshed for
+    # ROTATION_STALE_AFTER seconds belongs to a crashed rotation
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,30 @@
+from db import db
+
+class LoanHead(db.Model):
+    """
+    One row per loan mirroring its chain tip, written in the same transaction
+    as each block. Backs indexed search so listings never scan blockchain_blocks.
+    """
+    __tablename__ = 'loan_heads'
+    loan_id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), nullable=False)
+    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'), nullable=True)
+
+    current_status = db.Column(db.String(32), nullable=False)
+    tip_hash = db.Column(db.String(64), nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+
+    initiated_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    # Every index ends in (initiated_at, loan_id) so search can filter and
+    # keyset-paginate newest-first from the index alone.
+    __table_args__ = (
+        db.Index('ix_loan_heads_user_time', 'user_id', 'initiated_at', 'loan_id'),
+        db.Index('ix_loan_heads_user_status_time', 'user_id', 'current_status', 'initiated_at', 'loan_id'),
+        db.Index('ix_loan_heads_bank_time', 'bank_id', 'initiated_at', 'loan_id'),
+        db.Index('ix_loan_heads_bank_status_time', 'bank_id', 'current_status', 'initiated_at', 'loan_id'),
+        db.Index('ix_loan_heads_agent_time', 'agent_id', 'initiated_at', 'loan_id'),
+        db.Index('ix_loan_heads_status_time', 'current_status', 'initiated_at', 'loan_id'),
+    )
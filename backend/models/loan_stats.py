@@ -0,0 +1,16 @@
+from db import db
+
+class LoanStatusCount(db.Model):
+    """Number of loans per bank currently in each status."""
+    __tablename__ = 'loan_status_counts'
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LoanDailyTransition(db.Model):
+    """Blocks appended per day, bank and status (genesis counts as 'initiated')."""
+    __tablename__ = 'loan_daily_transitions'
+    day = db.Column(db.Date, primary_key=True)
+    bank_id = db.Column(db.Integer, db.ForeignKey('banks.id'), primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,17 @@
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from db import db
+
+class MetadataChunk(db.Model):
+    """
+    One AEAD-sealed chunk of a streamed (chunked-v1) metadata payload. The
+    genesis block stores only the manifest; see services/stream_crypto_service.py.
+    """
+    __tablename__ = 'metadata_chunks'
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.String(64), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    ciphertext = db.Column(db.LargeBinary().with_variant(MEDIUMBLOB, 'mysql'), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('loan_id', 'seq', name='uq_metadata_chunks_loan_seq'),
+    )
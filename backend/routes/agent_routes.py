@@ -0,0 +1,11 @@
+from flask import Blueprint, jsonify
+from services.agent_service import pick_random_agent
+
+agent_bp = Blueprint('agent', __name__)
+
+@agent_bp.get('/agents/random')
+def random_agent():
+    agent = pick_random_agent()
+    if not agent:
+        return jsonify({"agent": None})
+    return jsonify({"agent": {"id": agent.agent_id, "name": agent.agent_name}})
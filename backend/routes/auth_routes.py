@@ -0,0 +1,85 @@
+import os
+from flask import Blueprint, request, jsonify
+from models.user import User
+from services.password_service import hash_password, check_password
+from services.key_rotation_service import RotationInProgressError, rotate_party_password
+from services.identity_cache_service import invalidate_user
+from utils.jwt import make_jwt
+from utils.admission import admission_controlled
+from db import db
+
+auth_bp = Blueprint('auth', __name__)
+
+@auth_bp.post('/auth/register')
+@admission_controlled("auth")
+def register_user():
+    body = request.json or {}
+    user_name = body.get('userName')
+    password = body.get('password')
+    if not user_name or not password:
+        return jsonify({"error": "userName and password required"}), 400
+
+    if User.query.filter_by(user_name=user_name).first():
+        return jsonify({"error": "User already exists"}), 400
+
+    password_hash = hash_password(password)
+    kdf_salt = os.urandom(16)
+
+    user = User(user_name=user_name, password_hash=password_hash, salt=kdf_salt)
+    db.session.add(user)
+    db.session.commit()
+    invalidate_user(user)
+
+    token = make_jwt(subject=user_name, role="user")
+    return jsonify({"message": "User registered", "token": token})
+
+@auth_bp.post('/auth/login')
+@admission_controlled("auth")
+def login_user():
+    body = request.json or {}
+    user_name = body.get('userName')
+    password = body.get('password')
+    if not user_name or not password:
+        return jsonify({"error": "userName and password required"}), 400
+
+    # credentials come from the database, never from the identity cache
+    user = User.query.filter_by(user_name=user_name).first()
+    if not user:
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    if not check_password(password, user.password_hash):
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    token = make_jwt(subject=user_name, role="user")
+    return jsonify({"message": "Login successful", "token": token})
+
+@auth_bp.post('/auth/rotate-password')
+@admission_controlled("rotation")
+def rotate_user_password():
+    """
+    Body: { "userName": "...", "password": "...", "newPassword": "..." }
+    Re-wraps the DEK of every loan owned by the user, then swaps the password hash.
+    New loans of the user are refused (409) while it runs.
+    Safe to retry with the same body if interrupted.
+    """
+    body = request.json or {}
+    user_name = body.get('userName')
+    password = body.get('password')
+    new_password = body.get('newPassword')
+    if not user_name or not password or not new_password:
+        return jsonify({"error": "userName, password and newPassword required"}), 400
+
+    user = User.query.filter_by(user_name=user_name).first()
+    if not user:
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    if not check_password(password, user.password_hash):
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    try:
+        summary = rotate_party_password("user", user, password, new_password)
+    except RotationInProgressError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "5"}
+    invalidate_user(user)
+    # failedLoans: DEKs neither password opens (e.g. initiated with a mistyped password)
+    return jsonify({"message": "Password rotated", **summary})
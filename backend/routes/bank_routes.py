@@ -0,0 +1,100 @@
+import os
+from flask import Blueprint, request, jsonify
+from models.bank import Bank
+from services.password_service import hash_password, check_password
+from services.key_rotation_service import RotationInProgressError, rotate_party_password
+from services.identity_cache_service import list_banks as cached_banks, invalidate_bank
+from utils.jwt import make_jwt
+from utils.admission import admission_controlled
+from db import db
+
+bank_bp = Blueprint('bank', __name__)
+
+@bank_bp.post('/banks/register')
+@admission_controlled("auth")
+def register_bank():
+    body = request.json or {}
+    bank_id = body.get('bankId')
+    bank_name = body.get('bankName')
+    bank_password = body.get('bankPassword')
+    if not bank_id or not bank_name or not bank_password:
+        return jsonify({"error": "bankId, bankName, bankPassword required"}), 400
+
+    if Bank.query.filter_by(bank_id=bank_id).first():
+        return jsonify({"error": "Bank already exists"}), 400
+
+    password_hash = hash_password(bank_password)
+    kdf_salt = os.urandom(16)
+
+    bank = Bank(
+        bank_id=bank_id,
+        bank_name=bank_name,
+        bank_password_hash=password_hash,
+        salt=kdf_salt
+    )
+    db.session.add(bank)
+    db.session.commit()
+    invalidate_bank(bank)
+
+    token = make_jwt(subject=bank_id, role="bank")
+    return jsonify({"message": "Bank registered", "token": token})
+
+@bank_bp.post('/banks/login')
+@admission_controlled("auth")
+def login_bank():
+    body = request.json or {}
+    bank_id = body.get('bankId')
+    bank_password = body.get('bankPassword')
+    if not bank_id or not bank_password:
+        return jsonify({"error": "bankId and bankPassword required"}), 400
+
+    # credentials come from the database, never from the identity cache
+    bank = Bank.query.filter_by(bank_id=bank_id).first()
+    if not bank:
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    if not check_password(bank_password, bank.bank_password_hash):
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    # The token is required by bank-only endpoints (loan listing, close)
+    token = make_jwt(subject=bank.bank_id, role="bank")
+    return jsonify({"message": "Login successful", "bankId": bank.bank_id, "bankName": bank.bank_name, "token": token})
+
+@bank_bp.post('/banks/rotate-password')
+@admission_controlled("rotation")
+def rotate_bank_password():
+    """
+    Body: { "bankId": "...", "bankPassword": "...", "newBankPassword": "..." }
+    Re-wraps the DEK of every loan held by the bank, then swaps the password hash.
+    New loans of the bank are refused (409) while it runs.
+    Safe to retry with the same body if interrupted.
+    """
+    body = request.json or {}
+    bank_id = body.get('bankId')
+    bank_password = body.get('bankPassword')
+    new_bank_password = body.get('newBankPassword')
+    if not bank_id or not bank_password or not new_bank_password:
+        return jsonify({"error": "bankId, bankPassword and newBankPassword required"}), 400
+
+    bank = Bank.query.filter_by(bank_id=bank_id).first()
+    if not bank:
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    if not check_password(bank_password, bank.bank_password_hash):
+        return jsonify({"error": "Invalid credentials"}), 401
+
+    try:
+        summary = rotate_party_password("bank", bank, bank_password, new_bank_password)
+    except RotationInProgressError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "5"}
+    invalidate_bank(bank)
+    # failedLoans: DEKs neither password opens (e.g. initiated with a mistyped password)
+    return jsonify({"message": "Password rotated", **summary})
+
+@bank_bp.get('/banks/list')
+def list_banks():
+    banks = cached_banks()
+    return jsonify([
+        {"bankId": b.bank_id, "bankName": b.bank_name}
+        for b in banks
+    ])
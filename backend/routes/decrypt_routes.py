@@ -1,42 +1,138 @@
-from flask import Blueprint, request, jsonify
-from models.user import User
-from models.bank import Bank
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from models.block import Block
 from models.encrypted_key import EncryptedKey
 from services.encryption_service import kdf_key, decrypt_dek_for_party, decrypt_json_with_dek
+from services.archive_service import load_archived_genesis
+from services.stream_crypto_service import is_chunked, iter_decrypted_stream
+from services.identity_cache_service import bank_salt, get_user_by_name, get_bank, user_salt
+from utils.admission import admission_controlled
+from utils.sharding import iter_in_shard, loan_shard, shard_of
 
 decrypt_bp = Blueprint('decrypt', __name__)
 
-@decrypt_bp.post('/loan/<loan_id>/decrypt/for-user')
-def decrypt_for_user(loan_id):
-    body = request.json
+def _loan_rows(loan_id):
+    """
+    (EncryptedKey, genesis) of a loan from its ledger shard; the genesis
+    metadata comes from the archive tier once the loan is archived.
+    """
+    with loan_shard(loan_id):
+        enc = EncryptedKey.query.filter_by(loan_id=loan_id).first()
+        genesis = (Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.asc()).first()
+                   or load_archived_genesis(loan_id))
+    return enc, genesis
+
+def _unwrap_for_user(loan_id):
+    """
+    Body: { "userName": "...", "password": "..." }
+    Returns (dek, genesis, None) or (None, None, error_response).
+    """
+    body = request.json or {}
     user_name = body.get('userName')
     password = body.get('password')
+    if not user_name or not password:
+        return None, None, (jsonify({"error": "userName and password required"}), 400)
 
-    user = User.query.filter_by(user_name=user_name).first()
-    enc = EncryptedKey.query.filter_by(loan_id=loan_id).first()
-    block = Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.asc()).first()  # genesis metadata
+    user = get_user_by_name(user_name)
+    enc, block = _loan_rows(loan_id)
     if not user or not enc or not block:
-        return jsonify({"error": "Not found"}), 404
+        return None, None, (jsonify({"error": "Not found"}), 404)
 
-    user_key = kdf_key(password, user.salt)
-    dek = decrypt_dek_for_party(enc.dek_cipher_for_user, enc.dek_nonce_for_user, user_key)
-    plaintext = decrypt_json_with_dek(block.metadata_ciphertext, block.metadata_nonce, dek)
-    return jsonify({"metadata": plaintext})
+    # Derive user key and decrypt DEK
+    try:
+        user_key = kdf_key(password, user_salt(user.id), current_app.config['KDF_ITERATIONS'])
+        dek = decrypt_dek_for_party(enc.dek_cipher_for_user, enc.dek_nonce_for_user, user_key)
+    except Exception:
+        return None, None, (jsonify({"error": "Decryption failed"}), 401)
+    return dek, block, None
 
-@decrypt_bp.post('/loan/<loan_id>/decrypt/for-bank')
-def decrypt_for_bank(loan_id):
-    body = request.json
+def _unwrap_for_bank(loan_id):
+    """
+    Body: { "bankId": "...", "bankPassword": "..." }
+    Returns (dek, genesis, None) or (None, None, error_response).
+    """
+    body = request.json or {}
     bank_id = body.get('bankId')
     bank_password = body.get('bankPassword')
+    if not bank_id or not bank_password:
+        return None, None, (jsonify({"error": "bankId and bankPassword required"}), 400)
 
-    bank = Bank.query.filter_by(bank_id=bank_id).first()
-    enc = EncryptedKey.query.filter_by(loan_id=loan_id).first()
-    block = Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.asc()).first()
+    bank = get_bank(bank_id)
+    enc, block = _loan_rows(loan_id)
     if not bank or not enc or not block:
-        return jsonify({"error": "Not found"}), 404
+        return None, None, (jsonify({"error": "Not found"}), 404)
+
+    # Derive bank key and decrypt DEK
+    try:
+        bank_key = kdf_key(bank_password, bank_salt(bank.id), current_app.config['KDF_ITERATIONS'])
+        dek = decrypt_dek_for_party(enc.dek_cipher_for_bank, enc.dek_nonce_for_bank, bank_key)
+    except Exception:
+        return None, None, (jsonify({"error": "Decryption failed"}), 401)
+    return dek, block, None
+
+def _metadata_response(loan_id, dek, genesis):
+    if is_chunked(genesis.metadata_ciphertext):
+        return jsonify({"error": "Metadata is stored chunked; use the /stream endpoint"}), 409
+    try:
+        plaintext = decrypt_json_with_dek(genesis.metadata_ciphertext, genesis.metadata_nonce, dek)
+    except Exception:
+        return jsonify({"error": "Decryption failed"}), 401
+    return jsonify({"metadata": plaintext})
+
+def _metadata_stream_response(loan_id, dek, genesis):
+    """
+    Streams the plaintext metadata as the raw response body, one chunk at a
+    time. Works for both chunked-v1 and single-ciphertext loans.
+    """
+    if not is_chunked(genesis.metadata_ciphertext):
+        return _metadata_response(loan_id, dek, genesis)
+
+    chunks = iter_decrypted_stream(loan_id, genesis.metadata_ciphertext, genesis.metadata_nonce, dek)
+    return Response(stream_with_context(iter_in_shard(shard_of(loan_id), chunks)), mimetype="application/json")
+
+@decrypt_bp.post('/loan/<loan_id>/decrypt/for-user')
+@admission_controlled("crypto")
+def decrypt_for_user(loan_id):
+    """
+    Body: { "userName": "...", "password": "..." }
+    Returns plaintext metadata JSON (string) if correct.
+    """
+    dek, genesis, error = _unwrap_for_user(loan_id)
+    if error:
+        return error
+    return _metadata_response(loan_id, dek, genesis)
+
+@decrypt_bp.post('/loan/<loan_id>/decrypt/for-bank')
+@admission_controlled("crypto")
+def decrypt_for_bank(loan_id):
+    """
+    Body: { "bankId": "...", "bankPassword": "..." }
+    Returns plaintext metadata JSON (string) if correct.
+    """
+    dek, genesis, error = _unwrap_for_bank(loan_id)
+    if error:
+        return error
+    return _metadata_response(loan_id, dek, genesis)
+
+@decrypt_bp.post('/loan/<loan_id>/decrypt/for-user/stream')
+@admission_controlled("crypto")
+def decrypt_for_user_stream(loan_id):
+    """
+    Body: { "userName": "...", "password": "..." }
+    Streams the plaintext metadata as the response body.
+    """
+    dek, genesis, error = _unwrap_for_user(loan_id)
+    if error:
+        return error
+    return _metadata_stream_response(loan_id, dek, genesis)
 
-    bank_key = kdf_key(bank_password, bank.salt)
-    dek = decrypt_dek_for_party(enc.dek_cipher_for_bank, enc.dek_nonce_for_bank, bank_key)
-    plaintext = decrypt_json_with_dek(block.metadata_ciphertext, block.metadata_nonce, dek)
-    return jsonify({"metadata": plaintext})
\ No newline at end of file
+@decrypt_bp.post('/loan/<loan_id>/decrypt/for-bank/stream')
+@admission_controlled("crypto")
+def decrypt_for_bank_stream(loan_id):
+    """
+    Body: { "bankId": "...", "bankPassword": "..." }
+    Streams the plaintext metadata as the response body.
+    """
+    dek, genesis, error = _unwrap_for_bank(loan_id)
+    if error:
+        return error
+    return _metadata_stream_response(loan_id, dek, genesis)
@@ -1,58 +1,374 @@
-from flask import Blueprint, request, jsonify
-from models.user import User
-from models.bank import Bank
+import datetime, itertools, json
+from flask import Blueprint, Response, current_app, g, request, jsonify, stream_with_context
+from models.block import Block
 from services.agent_service import pick_random_agent
-from services.blockchain_service import create_genesis_block, append_status_block
+from services.blockchain_service import create_genesis_block, create_genesis_block_streaming, append_status_block, ChainConflictError
+from services.loan_search_service import search_loans, decode_cursor
+from services.chain_read_service import iter_loan_chain, iter_full_chain, iter_bank_loans
+from services.archive_service import LoanArchivedError, is_archived, load_archived_chain, iter_archived_chains, verify_archive
+from models.archived_loan import ArchivedLoan
+from services.key_rotation_service import RotationInProgressError
+from services.identity_cache_service import get_user_by_name, get_user_by_id, get_bank, get_agent
+from utils.validators import VALID_TRANSITION_STATUSES
+from utils.admission import admission_controlled
+from utils.jwt import require_jwt
+from utils.idempotency import idempotent
+from utils.sharding import loan_shard, shard_indexes, use_shard
 from db import db
 
 loan_bp = Blueprint('loan', __name__)
 
+def serialize_block(b) -> dict:
+    # b: a Block or a chain_read_service.BlockRow
+    return {
+        "id": b.id,
+        "loanId": b.loan_id,
+        "transaction": b.transaction_data,
+        "previousHash": b.previous_hash,
+        "currentHash": b.current_hash,
+        "bankName": b.bank_name_public,
+        "metadata": {
+            "ciphertext": b.metadata_ciphertext,  # encrypted, visible to all
+            "nonceHex": b.metadata_nonce.hex()
+        },
+        "createdAt": b.created_at.isoformat()
+    }
+
+def _include_archived() -> bool:
+    return request.args.get('includeArchived', '').lower() in ('1', 'true', 'yes')
+
+def _json_array_stream(items) -> Response:
+    # Encodes one element at a time, so large listings never build the whole
+    # list (or the whole body) in memory.
+    dumps = current_app.json.dumps
+    def generate():
+        sep = "["
+        for item in items:
+            yield sep + dumps(item)
+            sep = ","
+        yield "[]" if sep == "[" else "]"
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
 @loan_bp.post('/loan/initiate')
+@idempotent
+@admission_controlled("crypto")
 def initiate():
-    data = request.json
+    """
+    Body:
+    {
+      "userName": "...",
+      "bankId": "...",
+      "metadataJson": "<JSON TEXT>",
+      "userPassword": "...",   // used for user-side decryption
+      "bankPassword": "..."    // used for bank-side decryption
+    }
+    Send an Idempotency-Key header to make client retries safe.
+    """
+    data = request.json or {}
     user_name = data.get('userName')
     bank_id = data.get('bankId')
     metadata_json = data.get('metadataJson')  # full JSON text as string
     user_password = data.get('userPassword')  # entered at apply time
     bank_password = data.get('bankPassword')  # for verification show
 
-    user = User.query.filter_by(user_name=user_name).first()
-    bank = Bank.query.filter_by(bank_id=bank_id).first()
+    if not all([user_name, bank_id, metadata_json, user_password, bank_password]):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    user = get_user_by_name(user_name)
+    bank = get_bank(bank_id)
     if not user or not bank:
-        return jsonify({"error": "User or Bank not found"}), 400
+        return jsonify({"error": "User or Bank not found"}), 404
 
     agent = pick_random_agent()
-    loan_id, block = create_genesis_block(user, bank, agent, metadata_json, user_password, bank_password)
+    try:
+        loan_id, block = create_genesis_block(
+            user=user,
+            bank=bank,
+            agent=agent,
+            metadata_json_text=metadata_json,
+            user_password=user_password,
+            bank_password=bank_password
+        )
+    except RotationInProgressError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "5"}
 
     return jsonify({"loanId": loan_id, "agent": {"id": agent.agent_id, "name": agent.agent_name} if agent else None, "blockHash": block.current_hash})
 
+# Longest credentials line accepted ahead of a streamed metadata body
+STREAM_PREAMBLE_MAX = 4096
+
+@loan_bp.post('/loan/initiate/stream')
+@admission_controlled("crypto")
+def initiate_stream():
+    """
+    Streaming variant of /loan/initiate for large metadata payloads.
+    The body starts with one line of JSON carrying the other fields,
+        {"userName": "...", "bankId": "...", "userPassword": "...", "bankPassword": "..."}\n
+    followed by the raw metadata JSON. Credentials travel in the body, never
+    in headers, which proxies and access logs tend to record.
+    The metadata is sealed chunk by chunk, so it is never held in memory whole.
+    """
+    preamble = request.stream.readline(STREAM_PREAMBLE_MAX + 1)
+    try:
+        if not preamble.endswith(b"\n"):
+            raise ValueError
+        fields = json.loads(preamble)
+        if not isinstance(fields, dict):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Body must start with a line of JSON holding userName, bankId, userPassword and bankPassword"}), 400
+    user_name = fields.get('userName')
+    bank_id = fields.get('bankId')
+    user_password = fields.get('userPassword')
+    bank_password = fields.get('bankPassword')
+
+    if not all([user_name, bank_id, user_password, bank_password]):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    user = get_user_by_name(user_name)
+    bank = get_bank(bank_id)
+    if not user or not bank:
+        return jsonify({"error": "User or Bank not found"}), 404
+
+    agent = pick_random_agent()
+    try:
+        loan_id, block = create_genesis_block_streaming(
+            user=user,
+            bank=bank,
+            agent=agent,
+            stream=request.stream,
+            user_password=user_password,
+            bank_password=bank_password
+        )
+    except RotationInProgressError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "5"}
+
+    return jsonify({"loanId": loan_id, "agent": {"id": agent.agent_id, "name": agent.agent_name} if agent else None, "blockHash": block.current_hash})
+
+def _check_loan_bank(loan_id: str, bank_id: str):
+    """
+    Returns an error response unless bank_id is the bank that initiated the
+    loan (per its genesis block), else None.
+    """
+    bank = get_bank(bank_id)
+    with loan_shard(loan_id):
+        genesis = Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.asc()).first()
+        archived = bank and not genesis and is_archived(loan_id)
+
+    if archived:
+        return jsonify({"error": f"Loan {loan_id} is archived and accepts no more blocks"}), 409
+    if not bank or not genesis:
+        return jsonify({"error": "Loan or Bank not found"}), 404
+
+    if genesis.bank_id != bank.id:
+        return jsonify({"error": "Unauthorized: Bank is not the initiator of this loan"}), 403
+    return None
+
 @loan_bp.post('/loan/<loan_id>/transition')
+@require_jwt(role="bank")
+@idempotent
 def transition(loan_id):
-    data = request.json
+    """
+    Body: { "status": "accepted|paid|unpaid|completed|closed" }
+    Requires a bearer token of the bank that initiated the loan.
+    Send an Idempotency-Key header to make client retries safe.
+    """
+    data = request.json or {}
     status = data.get('status')
-    if status not in {"accepted", "paid", "unpaid", "completed"}:
+    if status not in VALID_TRANSITION_STATUSES:
         return jsonify({"error": "Invalid status"}), 400
 
-    block = append_status_block(loan_id, status)
+    error = _check_loan_bank(loan_id, g.jwt_claims["sub"])
+    if error:
+        return error
+
+    try:
+        block = append_status_block(loan_id, status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except ChainConflictError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "1"}
+    except LoanArchivedError as e:
+        return jsonify({"error": str(e)}), 409
+
     return jsonify({"blockHash": block.current_hash, "status": block.transaction_data})
 
+@loan_bp.post('/loan/<loan_id>/close')
+@require_jwt(role="bank")
+def close(loan_id):
+    """
+    Endpoint for a bank to transition a specific loan to the 'closed' status.
+    Requires a bank bearer token. Body (optional): { "bankId": "..." }
+    """
+    body = request.get_json(silent=True) or {}
+    bank_id_from_request = body.get('bankId') or g.jwt_claims["sub"]
+
+    if bank_id_from_request != g.jwt_claims["sub"]:
+        return jsonify({"error": "Unauthorized: token does not belong to this bank"}), 403
+
+    # 1. Verify the bank exists and is associated with the loan (using the genesis block)
+    error = _check_loan_bank(loan_id, bank_id_from_request)
+    if error:
+        return error
+
+    # 2. Append the new status block
+    try:
+        block = append_status_block(loan_id, "closed")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except ChainConflictError as e:
+        return jsonify({"error": str(e)}), 409, {"Retry-After": "1"}
+    except LoanArchivedError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception:
+        return jsonify({"error": "Failed to close loan due to internal error"}), 500
+
+    return jsonify({
+        "message": f"Loan {loan_id} successfully transitioned to 'closed'.",
+        "loanId": loan_id,
+        "newStatus": block.transaction_data,
+        "blockHash": block.current_hash
+    })
+
+@loan_bp.get('/loan/bank/<bank_id>')
+@require_jwt(role="bank")
+def loans_for_bank(bank_id):
+    """
+    Retrieves the latest block for every loan associated with the given bank_id.
+    Requires a bearer token issued to that bank.
+    """
+    if g.jwt_claims["sub"] != bank_id:
+        return jsonify({"error": "Unauthorized: token does not belong to this bank"}), 403
+    bank = get_bank(bank_id)
+    if not bank:
+        return jsonify({"error": "Bank not found"}), 404
+
+    # One query over loan_heads per shard; we include just the essential, latest public data
+    return _json_array_stream({
+        "loanId": r.loan_id,
+        "latestStatus": r.current_status,
+        "user": getattr(get_user_by_id(r.user_id), "user_name", "N/A"),
+        "latestBlockHash": r.tip_hash,
+        "initiatedAt": r.updated_at.isoformat()  # time of the latest block
+    } for r in iter_bank_loans(bank.id))
+
+@loan_bp.get('/loan/search')
+@require_jwt()
+def search():
+    """
+    Query: userName, bankId, agentId, status, from, to (ISO dates, initiation
+    time, to exclusive), limit (default 50, max 500), cursor (from nextCursor).
+    Bank tokens only see their own loans, user tokens only their own.
+    """
+    args = request.args
+    claims = g.jwt_claims
+    user_name = claims["sub"] if claims["role"] == "user" else args.get('userName')
+    bank_ref = claims["sub"] if claims["role"] == "bank" else args.get('bankId')
+    agent_ref = args.get('agentId')
+    status = args.get('status')
+    if status is not None and status not in VALID_TRANSITION_STATUSES | {"initiated"}:
+        return jsonify({"error": "Invalid status"}), 400
+
+    try:
+        limit = min(max(int(args.get('limit', 50)), 1), 500)
+        since = datetime.datetime.fromisoformat(args['from']) if 'from' in args else None
+        until = datetime.datetime.fromisoformat(args['to']) if 'to' in args else None
+        cursor = args.get('cursor')
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError:
+        return jsonify({"error": "Invalid limit, from, to or cursor"}), 400
+
+    # Resolve public ids to primary keys; an unknown id simply matches nothing
+    filters = {}
+    for key, ref, lookup in (("user_id", user_name, get_user_by_name),
+                             ("bank_id", bank_ref, get_bank),
+                             ("agent_id", agent_ref, get_agent)):
+        if ref:
+            row = lookup(ref)
+            if row is None:
+                return jsonify({"loans": [], "nextCursor": None})
+            filters[key] = row.id
+
+    rows, next_cursor = search_loans(status=status, since=since, until=until, cursor=cursor or None, limit=limit, **filters)
+    return jsonify({
+        "loans": [{
+            "loanId": r.loan_id,
+            "status": r.current_status,
+            "user": r.user_name,
+            "bankId": r.bank_id,
+            "agentId": r.agent_id,
+            "height": r.height,
+            "latestBlockHash": r.tip_hash,
+            "initiatedAt": r.initiated_at.isoformat(),
+            "updatedAt": r.updated_at.isoformat()
+        } for r in rows],
+        "nextCursor": next_cursor
+    })
+
+@loan_bp.get('/loan/full-chain')
+def full_chain():
+    """
+    Query: includeArchived=1 appends archived chains (loan by loan, in
+    initiation order) after the live blocks.
+    """
+    blocks = iter_full_chain()
+    if _include_archived():
+        blocks = itertools.chain(blocks, *(iter_archived_chains(shard) for shard in shard_indexes()))
+    return _json_array_stream(serialize_block(b) for b in blocks)
+
+@loan_bp.get('/loan/block/<int:loanId>')
+def block_by_id(loanId):
+    """
+    Block ids are unique per ledger shard; with several shards configured an
+    id can match more than once, and the query parameter loanId selects one.
+    """
+    loan_id = request.args.get('loanId')
+    shards = [loan_shard(loan_id)] if loan_id else [use_shard(shard) for shard in shard_indexes()]
+    found = []
+    for scope in shards:
+        with scope:
+            block = db.session.get(Block, loanId)
+            if block and (not loan_id or block.loan_id == loan_id):
+                found.append(serialize_block(block))
+            db.session.expunge_all()  # the same id may be loaded from the next shard
+    if not found:
+        return jsonify({"error": "Block not found"}), 404
+    if len(found) > 1:
+        return jsonify({"error": "Block id exists on several shards; pass loanId", "loanIds": [b["loanId"] for b in found]}), 409
+    return jsonify(found[0])
+
+@loan_bp.get('/loan/<loan_id>')
+def loan_chain(loan_id):
+    """Query: includeArchived=1 serves the chain from the archive tier once archived."""
+    blocks = [serialize_block(b) for b in iter_loan_chain(loan_id)]
+    if not blocks and _include_archived():
+        with loan_shard(loan_id):
+            blocks = [serialize_block(b) for b in load_archived_chain(loan_id) or ()]
+    return jsonify(blocks)
+
 @loan_bp.get('/loan/<loan_id>/chain')
 def chain(loan_id):
-    from models.block import Block
-    blocks = Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.asc()).all()
-    result = []
-    for b in blocks:
-        result.append({
-            "id": b.id,
-            "loanId": b.loan_id,
-            "transaction": b.transaction_data,
-            "previousHash": b.previous_hash,
-            "currentHash": b.current_hash,
-            "bankName": b.bank_name_public,
-            "metadata": {
-                "ciphertext": b.metadata_ciphertext,  # still encrypted
-                "nonceHex": b.metadata_nonce.hex()
-            },
-            "createdAt": b.created_at.isoformat()
-        })
-    return jsonify(result)
\ No newline at end of file
+    return loan_chain(loan_id)
+
+@loan_bp.get('/loan/<loan_id>/archive')
+def archive_summary(loan_id):
+    """Summary of an archived chain, re-verified against its payload."""
+    with loan_shard(loan_id):
+        archive = db.session.get(ArchivedLoan, loan_id)
+        if not archive:
+            return jsonify({"error": "Loan is not archived"}), 404
+        problems = verify_archive(archive, current_app.config['APP_HASH_SALT'])
+    return jsonify({
+        "loanId": archive.loan_id,
+        "genesisBlockId": archive.genesis_block_id,
+        "genesisHash": archive.genesis_hash,
+        "finalHash": archive.final_hash,
+        "finalStatus": archive.final_status,
+        "height": archive.height,
+        "initiatedAt": archive.initiated_at.isoformat(),
+        "finishedAt": archive.finished_at.isoformat(),
+        "archivedAt": archive.archived_at.isoformat(),
+        "verified": not problems,
+        "problems": problems
+    })
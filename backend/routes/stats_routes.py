@@ -0,0 +1,41 @@
+from flask import Blueprint, g, request, jsonify
+from services.identity_cache_service import get_bank
+from services.stats_service import bank_stats, global_stats
+from utils.jwt import require_jwt
+
+stats_bp = Blueprint('stats', __name__)
+
+def _days():
+    try:
+        return min(max(int(request.args.get('days', 30)), 1), 366)
+    except ValueError:
+        return None
+
+@stats_bp.get('/stats/bank/<bank_id>')
+@require_jwt(role="bank")
+def stats_for_bank(bank_id):
+    """
+    Loan counts by current status plus daily transition volumes for one bank.
+    Query: days (default 30). Requires a bearer token issued to that bank.
+    """
+    if g.jwt_claims["sub"] != bank_id:
+        return jsonify({"error": "Unauthorized: token does not belong to this bank"}), 403
+    days = _days()
+    if days is None:
+        return jsonify({"error": "Invalid days"}), 400
+
+    bank = get_bank(bank_id)
+    if not bank:
+        return jsonify({"error": "Bank not found"}), 404
+    return jsonify({"bankId": bank_id, **bank_stats(bank.id, days)})
+
+@stats_bp.get('/stats/global')
+def stats_global():
+    """
+    Portfolio-wide counts by status plus daily transition volumes. Needs no
+    token, so it carries no per-bank figures (see /stats/bank/<bank_id>).
+    """
+    days = _days()
+    if days is None:
+        return jsonify({"error": "Invalid days"}), 400
+    return jsonify(global_stats(days))
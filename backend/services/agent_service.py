@@ -1,6 +1,7 @@
 import random
-from models.agent import Agent
+from typing import Optional
+from services.identity_cache_service import AgentRecord, list_agents
 
-def pick_random_agent():
-    agents = Agent.query.all()
-    return random.choice(agents) if agents else None
\ No newline at end of file
+def pick_random_agent() -> Optional[AgentRecord]:
+    agents = list_agents()
+    return random.choice(agents) if agents else None
@@ -0,0 +1,217 @@
+import datetime, hashlib, json, zlib
+from collections import Counter
+from sqlalchemy import delete, select
+from models.archived_loan import ArchivedLoan
+from models.block import Block
+from models.loan_head import LoanHead
+from services.chain_read_service import BlockRow
+from services.hashing_service import compute_block_hash
+from utils.sharding import shard_engine
+from db import db
+
+# Statuses after which a chain never changes again (see flask archive-loans)
+ARCHIVABLE_STATUSES = ("closed",)
+GENESIS_PREVIOUS_HASH = "0" * 64
+ARCHIVE_CODEC = "zlib"
+
+class LoanArchivedError(Exception):
+    """The loan's chain lives in the archive tier and accepts no more blocks."""
+
+_blocks = Block.__table__
+
+# ---------------------------------------------------------------------------
+# Payload format: JSON array of [id, status, previous_hash, current_hash,
+# bank_name_public, metadata_ciphertext, nonce_hex, created_at_iso], oldest
+# first, zlib-compressed. It keeps every input of compute_block_hash, so an
+# archived chain can be re-verified without the live table.
+# ---------------------------------------------------------------------------
+
+def _encode(rows) -> bytes:
+    return zlib.compress(json.dumps([
+        [r.id, r.transaction_data, r.previous_hash, r.current_hash, r.bank_name_public,
+         r.metadata_ciphertext, r.metadata_nonce.hex(), r.created_at.isoformat()]
+        for r in rows
+    ], separators=(",", ":")).encode("utf-8"), 6)
+
+def _decode(loan_id: str, payload: bytes) -> list:
+    return [
+        BlockRow(block_id, loan_id, status, previous_hash, current_hash, bank_name,
+                 cipher, bytes.fromhex(nonce_hex), datetime.datetime.fromisoformat(created))
+        for block_id, status, previous_hash, current_hash, bank_name, cipher, nonce_hex, created
+        in json.loads(zlib.decompress(payload))
+    ]
+
+def _link(rows):
+    """
+    Order one loan's blocks by following previous_hash from the genesis block
+    (created_at can tie). Returns None unless they form a single linear chain.
+    """
+    by_parent = {}
+    for r in rows:
+        if r.previous_hash in by_parent:
+            return None  # fork
+        by_parent[r.previous_hash] = r
+    chain, parent = [], GENESIS_PREVIOUS_HASH
+    while parent in by_parent:
+        chain.append(by_parent[parent])
+        parent = chain[-1].current_hash
+    return chain if len(chain) == len(rows) else None
+
+def verify_archive(archive: ArchivedLoan, app_salt: str = None) -> list:
+    """
+    Check an archived chain against its summary; returns a list of problems
+    (empty when valid). With app_salt every block hash is also recomputed.
+    """
+    if hashlib.sha256(archive.payload).hexdigest() != archive.payload_sha256:
+        return ["payload digest mismatch"]
+    try:
+        rows = _decode(archive.loan_id, archive.payload)
+    except (ValueError, zlib.error) as e:
+        return [f"payload unreadable: {e}"]
+    if not rows:
+        return ["payload holds no blocks"]
+
+    problems = []
+    parent = GENESIS_PREVIOUS_HASH
+    for r in rows:
+        if r.previous_hash != parent:
+            problems.append(f"block {r.id} does not link to {parent}")
+        if app_salt is not None:
+            expected = compute_block_hash(r.metadata_ciphertext, r.transaction_data, r.previous_hash, archive.loan_id,
+                                          r.metadata_nonce.hex(), r.created_at.isoformat(), app_salt)
+            if expected != r.current_hash:
+                problems.append(f"block {r.id} hash mismatch")
+        parent = r.current_hash
+    if rows[0].id != archive.genesis_block_id or rows[0].current_hash != archive.genesis_hash:
+        problems.append("genesis does not match summary")
+    if rows[-1].current_hash != archive.final_hash or rows[-1].transaction_data != archive.final_status:
+        problems.append("final block does not match summary")
+    if len(rows) != archive.height:
+        problems.append(f"height {len(rows)} != summary {archive.height}")
+    return problems
+
+def archive_finished_loans(min_age_days: float, batch_size: int = 500, limit: int = None) -> dict:
+    """
+    Move the blocks of closed loans whose tip is older than
+    min_age_days into archived_loans, one transaction per batch.
+
+    A chain is archived only if its blocks form one linear chain that ends at
+    the loan_heads tip (read under FOR UPDATE, so a concurrent append either
+    lands first and the loan is skipped, or sees the archive row and fails
+    its compare-and-swap), and its encoded payload verifies against the
+    summary. loan_heads, encrypted keys and metadata chunks stay live.
+    Returns {"archived": n, "skipped": {loan_id: reason}}.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=min_age_days)
+    archived, skipped, last_loan = 0, {}, ""
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        loan_ids = list(db.session.scalars(
+            select(LoanHead.loan_id)
+            .outerjoin(ArchivedLoan, ArchivedLoan.loan_id == LoanHead.loan_id)
+            .where(LoanHead.current_status.in_(ARCHIVABLE_STATUSES), LoanHead.updated_at < cutoff,
+                   ArchivedLoan.loan_id.is_(None), LoanHead.loan_id > last_loan)
+            .order_by(LoanHead.loan_id).limit(size)
+        ))
+        if not loan_ids:
+            break
+        last_loan = loan_ids[-1]
+
+        heads = {h.loan_id: h for h in db.session.execute(
+            select(LoanHead.loan_id, LoanHead.tip_hash, LoanHead.height, LoanHead.current_status,
+                   LoanHead.initiated_at, LoanHead.updated_at)
+            .where(LoanHead.loan_id.in_(loan_ids)).with_for_update()
+        )}
+        chains = {}
+        for r in db.session.execute(
+            select(_blocks.c.id, _blocks.c.loan_id, _blocks.c.user_id, _blocks.c.bank_id, _blocks.c.agent_id,
+                   _blocks.c.transaction_data, _blocks.c.previous_hash, _blocks.c.current_hash,
+                   _blocks.c.bank_name_public, _blocks.c.metadata_ciphertext, _blocks.c.metadata_nonce,
+                   _blocks.c.created_at)
+            .where(_blocks.c.loan_id.in_(loan_ids))
+        ):
+            chains.setdefault(r.loan_id, []).append(r)
+
+        done = []
+        for loan_id in loan_ids:
+            head, rows = heads.get(loan_id), _link(chains.get(loan_id, ()))
+            if head is None or head.current_status not in ARCHIVABLE_STATUSES:
+                skipped[loan_id] = "no longer finished"
+                continue
+            if not rows:
+                skipped[loan_id] = "blocks do not form one linear chain"
+                continue
+            if rows[-1].current_hash != head.tip_hash or len(rows) != head.height:
+                skipped[loan_id] = "chain does not end at the recorded tip"
+                continue
+            payload = _encode(rows)
+            archive = ArchivedLoan(
+                loan_id=loan_id, user_id=rows[0].user_id, bank_id=rows[0].bank_id, agent_id=rows[0].agent_id,
+                genesis_block_id=rows[0].id, genesis_hash=rows[0].current_hash,
+                final_hash=head.tip_hash, final_status=head.current_status, height=head.height,
+                initiated_at=head.initiated_at, finished_at=head.updated_at,
+                codec=ARCHIVE_CODEC, payload=payload, payload_sha256=hashlib.sha256(payload).hexdigest()
+            )
+            problems = verify_archive(archive)
+            if problems:
+                skipped[loan_id] = "; ".join(problems)
+                continue
+            db.session.add(archive)
+            done.append(loan_id)
+
+        if done:
+            db.session.execute(delete(Block).where(Block.loan_id.in_(done)))
+        db.session.commit()
+        archived += len(done)
+    return {"archived": archived, "skipped": skipped}
+
+def is_archived(loan_id: str) -> bool:
+    return db.session.scalar(select(ArchivedLoan.loan_id).where(ArchivedLoan.loan_id == loan_id)) is not None
+
+def load_archived_chain(loan_id: str):
+    """Blocks of an archived loan as BlockRows, oldest first; None if not archived."""
+    payload = db.session.scalar(select(ArchivedLoan.payload).where(ArchivedLoan.loan_id == loan_id))
+    return None if payload is None else _decode(loan_id, payload)
+
+def load_archived_genesis(loan_id: str):
+    rows = load_archived_chain(loan_id)
+    return rows[0] if rows else None
+
+def iter_archived_chains(shard: int = 0, yield_per: int = 100):
+    """Every archived block of one ledger shard, loan by loan in initiation order."""
+    result = db.session.execute(
+        select(ArchivedLoan.loan_id, ArchivedLoan.payload)
+        .order_by(ArchivedLoan.initiated_at, ArchivedLoan.loan_id),
+        execution_options={"yield_per": yield_per},
+        bind_arguments={"bind": shard_engine(shard)}
+    )
+    for loan_id, payload in result:
+        yield from _decode(loan_id, payload)
+
+def archived_daily_counts() -> Counter:
+    """(day, bank_pk, status) -> blocks, over the archive tier (for rebuild_stats)."""
+    counts = Counter()
+    for bank_pk, loan_id, payload in db.session.execute(
+        select(ArchivedLoan.bank_id, ArchivedLoan.loan_id, ArchivedLoan.payload),
+        execution_options={"yield_per": 100}
+    ):
+        for r in _decode(loan_id, payload):
+            counts[(r.created_at.date(), bank_pk, r.transaction_data)] += 1
+    return counts
+
+def verify_archives(app_salt: str = None, batch_size: int = 200):
+    """Yield (loan_id, problems) for every archived loan that fails verify_archive."""
+    last_loan = ""
+    while True:
+        archives = list(db.session.scalars(
+            select(ArchivedLoan).where(ArchivedLoan.loan_id > last_loan)
+            .order_by(ArchivedLoan.loan_id).limit(batch_size)
+        ))
+        if not archives:
+            return
+        last_loan = archives[-1].loan_id
+        for archive in archives:
+            problems = verify_archive(archive, app_salt)
+            if problems:
+                yield archive.loan_id, problems
+        db.session.expunge_all()
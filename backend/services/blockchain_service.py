@@ -1,75 +1,220 @@
-import uuid, datetime
+import os, uuid, datetime, threading, zlib
+from typing import Optional
+from models.agent import Agent
+from models.archived_loan import ArchivedLoan
 from models.block import Block
 from models.encrypted_key import EncryptedKey
+from models.loan_head import LoanHead
 from models.bank import Bank
 from models.user import User
+from services.archive_service import LoanArchivedError, is_archived
 from services.hashing_service import compute_block_hash
+from services.identity_cache_service import bank_salt, user_salt
+from services.key_rotation_service import RotationInProgressError, rotation_in_progress
 from services.encryption_service import (encrypt_json_with_dek, encrypt_dek_for_party, kdf_key)
+from services.group_commit_service import get_group_committer
+from services.stats_service import record_genesis, record_transition
+from services.stream_crypto_service import delete_stream_chunks, store_encrypted_stream
+from utils.sharding import loan_shard
 from db import db
 from flask import current_app
+from sqlalchemy import exists, update
+from sqlalchemy.exc import DBAPIError
 
-def create_genesis_block(user: User, bank: Bank, agent, metadata_json_text: str, user_password: str, bank_password: str):
+def create_genesis_block(user: User, bank: Bank, agent: Optional[Agent], metadata_json_text: str, user_password: str, bank_password: str):
+    """
+    - Generate DEK
+    - Encrypt metadata with DEK
+    - Encrypt DEK for User and Bank (envelope)
+    - Create genesis block with transaction_data='initiated'
+    With GROUP_COMMIT_ENABLED the insert is coalesced with concurrent writes.
+    """
     loan_id = uuid.uuid4().hex[:16]
-    # Generate DEK
-    import os
+    # Generate random DEK
     dek = os.urandom(32)
 
-    # Encrypt metadata
-    metadata_cipher_b64, metadata_nonce = encrypt_json_with_dek(metadata_json_text, dek)
+    # Encrypt metadata JSON
+    metadata_cipher_b64, metadata_nonce = encrypt_json_with_dek(
+        metadata_json_text, dek,
+        codec=current_app.config['METADATA_CODEC'],
+        min_size=current_app.config['METADATA_COMPRESS_MIN_SIZE']
+    )
 
-    # Envelope encrypt DEK for both parties
-    user_key = kdf_key(user_password, user.salt)
-    bank_key = kdf_key(bank_password, bank.salt)
+    wrapped = _wrap_dek(dek, user, bank, user_password, bank_password)
+    block = _genesis(loan_id, user, bank, agent, metadata_cipher_b64, metadata_nonce, wrapped)
+    return loan_id, block
 
-    dek_cipher_user, dek_nonce_user = encrypt_dek_for_party(dek, user_key)
-    dek_cipher_bank, dek_nonce_bank = encrypt_dek_for_party(dek, bank_key)
+def create_genesis_block_streaming(user: User, bank: Bank, agent: Optional[Agent], stream, user_password: str, bank_password: str):
+    """
+    Same as create_genesis_block, but the metadata is read from a file-like
+    stream and stored as chunked-v1 sealed chunks (bounded memory). The block
+    carries the chunk manifest in place of the ciphertext.
+    """
+    loan_id = uuid.uuid4().hex[:16]
+    dek = os.urandom(32)
+    # PBKDF2 runs before the first chunk insert opens a write transaction
+    wrapped = _wrap_dek(dek, user, bank, user_password, bank_password)
 
-    enc = EncryptedKey(
-        loan_id=loan_id,
-        dek_cipher_for_user=dek_cipher_user,
-        dek_nonce_for_user=dek_nonce_user,
-        dek_cipher_for_bank=dek_cipher_bank,
-        dek_nonce_for_bank=dek_nonce_bank
-    )
-    db.session.add(enc)
+    try:
+        with loan_shard(loan_id):
+            # chunks are committed one by one as the body arrives
+            manifest, nonce_prefix = store_encrypted_stream(stream, loan_id, dek, current_app.config['METADATA_CHUNK_SIZE'])
+        block = _genesis(loan_id, user, bank, agent, manifest, nonce_prefix, wrapped)
+    except Exception:
+        with loan_shard(loan_id):
+            db.session.rollback()
+            # no block refers to the committed chunks
+            delete_stream_chunks(loan_id)
+            db.session.commit()
+        raise
+    return loan_id, block
 
-    # Build block
-    previous_hash = "0" * 64
-    now = datetime.datetime.utcnow().isoformat()
-    nonce_hex = metadata_nonce.hex()
-    block_hash = compute_block_hash(metadata_cipher_b64, "initiated", previous_hash, loan_id, nonce_hex, now, current_app.config['APP_HASH_SALT'])
+def _wrap_dek(dek, user, bank, user_password, bank_password):
+    """Envelope: encrypt the DEK for both parties."""
+    user_key = kdf_key(user_password, user_salt(user.id), current_app.config['KDF_ITERATIONS'])
+    bank_key = kdf_key(bank_password, bank_salt(bank.id), current_app.config['KDF_ITERATIONS'])
+    return encrypt_dek_for_party(dek, user_key) + encrypt_dek_for_party(dek, bank_key)
 
-    block = Block(
-        loan_id=loan_id,
-        user_id=user.id,
-        bank_id=bank.id,
-        agent_id=agent.id if agent else None,
-        metadata_ciphertext=metadata_cipher_b64,
-        metadata_nonce=metadata_nonce,
-        transaction_data="initiated",
-        previous_hash=previous_hash,
-        current_hash=block_hash,
-        bank_name_public=bank.bank_name
-    )
-    db.session.add(block)
-    db.session.commit()
+def _genesis(loan_id, user, bank, agent, metadata_cipher_b64, metadata_nonce, wrapped) -> Block:
+    dek_cipher_user, dek_nonce_user, dek_cipher_bank, dek_nonce_bank = wrapped
 
-    return loan_id, block
+    # Capture plain values so the insert can run in another thread's session
+    user_id, bank_pk, bank_name = user.id, bank.id, bank.bank_name
+    agent_pk = agent.id if agent else None
+    salt = current_app.config['APP_HASH_SALT']
+
+    def build():
+        # checked in the write itself, so the rotation's catch-up pass sees
+        # every loan that got past it
+        if rotation_in_progress(user_id, bank_pk):
+            raise RotationInProgressError("A password rotation for this user or bank is running, retry shortly")
+        enc = EncryptedKey(
+            loan_id=loan_id,
+            dek_cipher_for_user=dek_cipher_user,
+            dek_nonce_for_user=dek_nonce_user,
+            dek_cipher_for_bank=dek_cipher_bank,
+            dek_nonce_for_bank=dek_nonce_bank
+        )
+        db.session.add(enc)
+
+        # Build block
+        previous_hash = "0" * 64
+        created = datetime.datetime.utcnow()
+        now = created.isoformat()
+        nonce_hex = metadata_nonce.hex()
+        block_hash = compute_block_hash(metadata_cipher_b64, "initiated", previous_hash, loan_id, nonce_hex, now, salt)
+
+        block = Block(
+            loan_id=loan_id,
+            user_id=user_id,
+            bank_id=bank_pk,
+            agent_id=agent_pk,
+            metadata_ciphertext=metadata_cipher_b64,
+            metadata_nonce=metadata_nonce,
+            transaction_data="initiated",
+            previous_hash=previous_hash,
+            current_hash=block_hash,
+            bank_name_public=bank_name,
+            created_at=created
+        )
+        db.session.add(block)
+        db.session.add(LoanHead(
+            loan_id=loan_id,
+            user_id=user_id,
+            bank_id=bank_pk,
+            agent_id=agent_pk,
+            current_status="initiated",
+            tip_hash=block_hash,
+            height=1,
+            initiated_at=created,
+            updated_at=created
+        ))
+        record_genesis(bank_pk, created)
+        return block
+
+    with loan_shard(loan_id):
+        return _write(build)
+
+class ChainConflictError(Exception):
+    """Another writer moved the loan's tip; raised after bounded retries."""
+
+# Striped in-process locks: appends to the same loan serialize within a
+# worker, appends to different loans almost never share a stripe.
+_LOAN_LOCK_STRIPES = 256
+_loan_locks = [threading.Lock() for _ in range(_LOAN_LOCK_STRIPES)]
 
-def append_status_block(loan_id: str, new_status: str):
-    # fetch last block
-    last_block = Block.query.filter_by(loan_id=loan_id).order_by(Block.created_at.desc()).first()
+def _loan_lock(loan_id: str) -> threading.Lock:
+    return _loan_locks[zlib.crc32(loan_id.encode('utf-8')) % _LOAN_LOCK_STRIPES]
+
+def append_status_block(loan_id: str, new_status: str) -> Block:
+    """
+    Append a new block with updated transaction status.
+    Metadata is carried forward to maintain chain integrity.
+    With GROUP_COMMIT_ENABLED the insert is coalesced with concurrent writes.
+
+    Concurrency: the loan's stripe lock serializes appends inside this worker,
+    and the tip is compare-and-swapped on loan_heads so appends from other
+    workers cannot fork the chain; a lost race (or a deadlock on the bank's
+    counter rows) is retried against the new tip up to CHAIN_APPEND_RETRIES
+    times before ChainConflictError is raised.
+    """
+    salt = current_app.config['APP_HASH_SALT']
+    grouped = get_group_committer() is not None
+    for _ in range(current_app.config['CHAIN_APPEND_RETRIES']):
+        try:
+            with loan_shard(loan_id):
+                if grouped:
+                    # the group leader already applies a process's appends in order
+                    return _write(lambda: _build_status_block(loan_id, new_status, salt))
+                with _loan_lock(loan_id):
+                    return _write(lambda: _build_status_block(loan_id, new_status, salt))
+        except ChainConflictError:
+            db.session.rollback()
+        except DBAPIError as e:
+            # the database picked this append as a deadlock victim and rolled
+            # it back; run it again like a lost tip race
+            if not _is_deadlock(e):
+                raise
+            db.session.rollback()
+    raise ChainConflictError(f"Loan {loan_id} is being updated concurrently, retry later")
+
+def _is_deadlock(e: DBAPIError) -> bool:
+    # MySQL/InnoDB error 1213, PostgreSQL SQLSTATE 40P01
+    return getattr(e.orig, "pgcode", None) == "40P01" or e.orig.args[:1] == (1213,)
+
+def _build_status_block(loan_id: str, new_status: str, salt: str) -> Block:
+    # the head names the current tip (and sees earlier blocks of the same group batch)
+    head = db.session.get(LoanHead, loan_id, populate_existing=True)
+    if not head:
+        raise ValueError("Loan not found")
+    last_block = Block.query.filter_by(loan_id=loan_id, current_hash=head.tip_hash).first()
     if not last_block:
+        if is_archived(loan_id):
+            raise LoanArchivedError(f"Loan {loan_id} is archived and accepts no more blocks")
         raise ValueError("Loan not found")
 
     previous_hash = last_block.current_hash
     # carry forward same metadata (immutability: you can re-encrypt with same DEK or store empty metadata if unchanged)
     metadata_cipher_b64 = last_block.metadata_ciphertext
     metadata_nonce = last_block.metadata_nonce
-    now = datetime.datetime.utcnow().isoformat()
+    created = datetime.datetime.utcnow()
+    now = created.isoformat()
     nonce_hex = metadata_nonce.hex()
 
-    block_hash = compute_block_hash(metadata_cipher_b64, new_status, previous_hash, loan_id, nonce_hex, now, current_app.config['APP_HASH_SALT'])
+    block_hash = compute_block_hash(metadata_cipher_b64, new_status, previous_hash, loan_id, nonce_hex, now, salt)
+
+    # Compare-and-swap the tip before adding anything to the session, so a
+    # lost race leaves nothing behind.
+    old_status = head.current_status
+    swapped = db.session.execute(
+        update(LoanHead)
+        .where(LoanHead.loan_id == loan_id, LoanHead.tip_hash == previous_hash,
+               ~exists().where(ArchivedLoan.loan_id == loan_id))  # lost to `flask archive-loans`
+        .values(current_status=new_status, tip_hash=block_hash, height=LoanHead.height + 1, updated_at=created)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if swapped != 1:
+        raise ChainConflictError(f"Tip of loan {loan_id} moved")
 
     block = Block(
         loan_id=loan_id,
@@ -81,8 +226,26 @@ def append_status_block(loan_id: str, new_status: str):
         transaction_data=new_status,
         previous_hash=previous_hash,
         current_hash=block_hash,
-        bank_name_public=last_block.bank_name_public
+        bank_name_public=last_block.bank_name_public,
+        created_at=created
     )
     db.session.add(block)
+
+    record_transition(head.bank_id, old_status, new_status, created)
+    return block
+
+def _write(build):
+    """
+    Run a block builder and make it durable: one commit per call, or via the
+    group committer of the current shard when enabled. Either way the block
+    comes back detached with its attributes loaded, so callers can read it
+    outside the shard scope.
+    """
+    committer = get_group_committer()
+    if committer is not None:
+        return committer.submit(build)
+    block = build()
+    db.session.flush()
+    db.session.expunge(block)
     db.session.commit()
-    return block
\ No newline at end of file
+    return block
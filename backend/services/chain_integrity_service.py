@@ -0,0 +1,44 @@
+from sqlalchemy import func
+from models.archived_loan import ArchivedLoan
+from models.block import Block
+from models.loan_head import LoanHead
+from db import db
+
+def detect_forks(limit: int = 1000) -> list:
+    """
+    Report loans whose chain branches: several blocks with the same
+    previous_hash (possible only in data written before the
+    (loan_id, previous_hash) unique constraint existed), plus live loans
+    whose loan_heads tip does not match any block.
+    """
+    forks = []
+    branching = (
+        db.session.query(Block.loan_id, Block.previous_hash, func.count(Block.id))
+        .group_by(Block.loan_id, Block.previous_hash)
+        .having(func.count(Block.id) > 1)
+        .limit(limit)
+    )
+    for loan_id, previous_hash, count in branching:
+        children = (
+            db.session.query(Block.id, Block.current_hash, Block.transaction_data, Block.created_at)
+            .filter(Block.loan_id == loan_id, Block.previous_hash == previous_hash)
+            .order_by(Block.created_at, Block.id)
+        )
+        forks.append({
+            "loanId": loan_id,
+            "kind": "branch",
+            "previousHash": previous_hash,
+            "blocks": [{"id": b.id, "currentHash": b.current_hash, "transaction": b.transaction_data,
+                        "createdAt": b.created_at.isoformat()} for b in children],
+        })
+
+    dangling = (
+        db.session.query(LoanHead.loan_id, LoanHead.tip_hash)
+        .outerjoin(Block, (Block.loan_id == LoanHead.loan_id) & (Block.current_hash == LoanHead.tip_hash))
+        .outerjoin(ArchivedLoan, ArchivedLoan.loan_id == LoanHead.loan_id)
+        .filter(Block.id.is_(None), ArchivedLoan.loan_id.is_(None))
+        .limit(limit)
+    )
+    for loan_id, tip_hash in dangling:
+        forks.append({"loanId": loan_id, "kind": "dangling-head", "tipHash": tip_hash})
+    return forks
@@ -0,0 +1,69 @@
+import heapq
+from collections import namedtuple
+from sqlalchemy import select
+from models.block import Block
+from models.loan_head import LoanHead
+from utils.sharding import shard_engine, shard_indexes, shard_of
+from db import db
+
+# Read-only views of chain rows, selected with Core so no ORM instances,
+# identity-map entries or change tracking are created. Field names match the
+# Block attributes, so serialize_block() accepts either.
+BlockRow = namedtuple(
+    "BlockRow",
+    "id loan_id transaction_data previous_hash current_hash bank_name_public "
+    "metadata_ciphertext metadata_nonce created_at",
+)
+BankLoanRow = namedtuple("BankLoanRow", "loan_id current_status tip_hash initiated_at updated_at user_id")
+
+_blocks = Block.__table__
+_heads = LoanHead.__table__
+
+_block_columns = (
+    _blocks.c.id, _blocks.c.loan_id, _blocks.c.transaction_data, _blocks.c.previous_hash,
+    _blocks.c.current_hash, _blocks.c.bank_name_public, _blocks.c.metadata_ciphertext,
+    _blocks.c.metadata_nonce, _blocks.c.created_at,
+)
+
+def _iter(stmt, row_type, yield_per, shard):
+    # yield_per streams from a server-side cursor where the driver supports it;
+    # the explicit bind lets several shards stream side by side
+    result = db.session.execute(stmt, execution_options={"yield_per": yield_per},
+                                bind_arguments={"bind": shard_engine(shard)})
+    for row in result:
+        yield row_type._make(row)
+
+def _merge(iterators, key, reverse=False):
+    iterators = list(iterators)
+    if len(iterators) == 1:
+        return iterators[0]
+    return heapq.merge(*iterators, key=key, reverse=reverse)
+
+def iter_loan_chain(loan_id: str, yield_per: int = 500):
+    """Blocks of one loan, oldest first."""
+    stmt = (
+        select(*_block_columns)
+        .where(_blocks.c.loan_id == loan_id)
+        .order_by(_blocks.c.created_at.asc(), _blocks.c.id.asc())
+    )
+    return _iter(stmt, BlockRow, yield_per, shard_of(loan_id))
+
+def iter_full_chain(yield_per: int = 1000):
+    """Every block of every loan, oldest first (shards merged on created_at)."""
+    stmt = select(*_block_columns).order_by(_blocks.c.created_at.asc(), _blocks.c.id.asc())
+    return _merge((_iter(stmt, BlockRow, yield_per, shard) for shard in shard_indexes()),
+                  key=lambda r: r.created_at)
+
+def iter_bank_loans(bank_pk: int, yield_per: int = 1000):
+    """
+    Tip of every loan of a bank, newest first, in one indexed query over
+    loan_heads per shard (instead of one latest-block query per loan).
+    """
+    stmt = (
+        select(_heads.c.loan_id, _heads.c.current_status, _heads.c.tip_hash,
+               _heads.c.initiated_at, _heads.c.updated_at, _heads.c.user_id)
+        .where(_heads.c.bank_id == bank_pk)
+        .order_by(_heads.c.initiated_at.desc(), _heads.c.loan_id.desc())
+    )
+    return _merge((_iter(stmt, BankLoanRow, yield_per, shard) for shard in shard_indexes()),
+                  key=lambda r: (r.initiated_at, r.loan_id), reverse=True)
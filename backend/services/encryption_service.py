@@ -1,30 +1,103 @@
 import os, base64
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# cryptography is imported inside each helper rather than at module load so
+# that app start-up (and workers that never touch crypto) stay cheap; after the
+# first call the imports are plain sys.modules lookups.
 
 def kdf_key(password: str, salt: bytes, iterations: int = 200_000) -> bytes:
+    """
+    Derive a 256-bit key from password using PBKDF2-HMAC-SHA256.
+    """
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.primitives import hashes
+
     kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
     return kdf.derive(password.encode('utf-8'))
 
-def encrypt_json_with_dek(json_text: str, dek: bytes):
+# Metadata envelope versions:
+#   v1 (legacy): "<base64 ciphertext>" of the UTF-8 JSON
+#   v2:          "v2:<codec>:<base64 ciphertext>" of the codec-compressed JSON,
+#                with "v2:<codec>" as AES-GCM associated data so the codec
+#                label cannot be swapped without failing authentication.
+# Base64 never contains ':', so the two forms cannot be confused.
+ENVELOPE_V2 = "v2"
+CODECS = ("raw", "zlib", "zstd")
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        import zlib
+        return zlib.compress(data, 6)
+    if codec == "zstd":
+        import zstandard  # optional dependency, only needed when METADATA_CODEC=zstd
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        import zlib
+        return zlib.decompress(data)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "raw":
+        return data
+    raise ValueError(f"Unknown metadata codec: {codec}")
+
+def encrypt_json_with_dek(json_text: str, dek: bytes, codec: str = None, min_size: int = 0):
+    """
+    Encrypt plaintext JSON string with DEK using AES-256-GCM.
+    With a codec ("zlib"/"zstd"), payloads of at least min_size bytes are
+    compressed first and a v2 envelope is produced (smaller ones are stored
+    as v2 "raw"); without one the legacy v1 format is kept.
+    Returns (cipher_text, nonce_bytes).
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     nonce = os.urandom(12)
     aesgcm = AESGCM(dek)
-    ct = aesgcm.encrypt(nonce, json_text.encode('utf-8'), None)
-    return base64.b64encode(ct).decode('utf-8'), nonce
+    data = json_text.encode('utf-8')
+    if codec is None or codec == "none":
+        ct = aesgcm.encrypt(nonce, data, None)
+        return base64.b64encode(ct).decode('utf-8'), nonce
+
+    if codec not in CODECS:
+        raise ValueError(f"Unknown metadata codec: {codec}")
+    if len(data) < min_size:
+        codec = "raw"
+    header = f"{ENVELOPE_V2}:{codec}"
+    ct = aesgcm.encrypt(nonce, _compress(codec, data), header.encode('utf-8'))
+    return f"{header}:{base64.b64encode(ct).decode('utf-8')}", nonce
+
+def decrypt_json_with_dek(cipher_text: str, nonce: bytes, dek: bytes) -> str:
+    """
+    Decrypt either envelope version produced by encrypt_json_with_dek.
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-def decrypt_json_with_dek(cipher_b64: str, nonce: bytes, dek: bytes) -> str:
     aesgcm = AESGCM(dek)
-    ct = base64.b64decode(cipher_b64.encode('utf-8'))
+    if cipher_text.startswith(ENVELOPE_V2 + ":"):
+        version, codec, cipher_b64 = cipher_text.split(":", 2)
+        header = f"{version}:{codec}"
+        ct = base64.b64decode(cipher_b64.encode('utf-8'))
+        return _decompress(codec, aesgcm.decrypt(nonce, ct, header.encode('utf-8'))).decode('utf-8')
+
+    ct = base64.b64decode(cipher_text.encode('utf-8'))
     pt = aesgcm.decrypt(nonce, ct, None)
     return pt.decode('utf-8')
 
 def encrypt_dek_for_party(dek: bytes, party_key: bytes):
+    """
+    Encrypt raw DEK using the party's derived key.
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     nonce = os.urandom(12)
     aesgcm = AESGCM(party_key)
     ct = aesgcm.encrypt(nonce, dek, None)
     return ct, nonce
 
 def decrypt_dek_for_party(cipher: bytes, nonce: bytes, party_key: bytes) -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
     aesgcm = AESGCM(party_key)
     return aesgcm.decrypt(nonce, cipher, None)
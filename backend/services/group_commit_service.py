@@ -0,0 +1,151 @@
+import threading, time
+from flask import current_app
+from utils.sharding import current_shard, shard_engine, use_shard
+from db import db
+
+class _Pending:
+    __slots__ = ("work", "done", "result", "error", "lead")
+
+    def __init__(self, work):
+        self.work = work
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.lead = False
+
+class GroupCommitter:
+    """
+    Coalesces concurrent writes into one transaction (one fsync per batch).
+
+    The first caller to arrive becomes the leader: it waits up to window_ms
+    (or until max_batch writes are queued), runs every queued work function in
+    its own session, commits once and wakes the other callers with their own
+    result or error. If writes arrived while the batch was committing, the
+    oldest waiter is promoted to lead the next batch.
+
+    Each work function runs (and is flushed) inside its own SAVEPOINT, so an
+    item that fails part-way is rolled back alone and reported to its caller
+    while the rest of the batch commits. The ORM object a work function
+    returns is detached before commit and handed back.
+    Each ledger shard has its own committer, and batches run in its scope.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int, shard: int = 0):
+        self.shard = shard
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leader_active = False
+
+    def submit(self, work):
+        item = _Pending(work)
+        with self._cond:
+            self._pending.append(item)
+            if not self._leader_active:
+                self._leader_active = True
+                item.lead = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+        while True:
+            if item.lead:
+                item.lead = False
+                self._lead()
+            item.done.wait()
+            if not item.lead:
+                break
+            item.done.clear()
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _lead(self):
+        with self._cond:
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+
+        try:
+            with use_shard(self.shard):
+                self._run_batch(batch)
+        finally:
+            with self._cond:
+                if self._pending:
+                    # hand leadership to the oldest waiter
+                    nxt = self._pending[0]
+                    nxt.lead = True
+                    nxt.done.set()
+                else:
+                    self._leader_active = False
+            for item in batch:
+                item.done.set()
+
+    def _run_batch(self, batch):
+        self._begin()
+        ok = []
+        for item in batch:
+            savepoint = db.session.begin_nested()
+            try:
+                item.result = item.work()
+                db.session.flush()
+                savepoint.commit()
+                ok.append(item)
+            except Exception as e:
+                item.error = e
+                try:
+                    savepoint.rollback()
+                except Exception:
+                    # the database already rolled the whole transaction back
+                    # (an InnoDB deadlock victim loses its savepoints too):
+                    # nothing of this batch is left to commit
+                    db.session.rollback()
+                    for other in batch:
+                        other.error = other.error or e
+                    return
+
+        try:
+            db.session.flush()
+            # Detach the results so callers on other threads can read them
+            # after commit without touching the leader's session.
+            for item in ok:
+                if item.result in db.session:
+                    db.session.expunge(item.result)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for item in ok:
+                item.error = e
+
+    def _begin(self):
+        # pysqlite only opens a transaction before DML, so the first SAVEPOINT
+        # would become the outer transaction and its RELEASE would commit the
+        # item on its own; open the batch transaction explicitly instead
+        conn = db.session.connection(bind_arguments={"bind": shard_engine(self.shard)})
+        if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+
+def get_group_committer():
+    """
+    Returns the app's GroupCommitter for the current ledger shard, or None
+    when GROUP_COMMIT_ENABLED is off.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get("GROUP_COMMIT_ENABLED"):
+        return None
+    committers = app.extensions.setdefault("group_commit", {})
+    shard = current_shard()
+    committer = committers.get(shard)
+    if committer is None:
+        committer = committers.setdefault(shard, GroupCommitter(
+            app.config["GROUP_COMMIT_WINDOW_MS"],
+            app.config["GROUP_COMMIT_MAX_BATCH"],
+            shard
+        ))
+    return committer
@@ -0,0 +1,203 @@
+import base64, json, threading, time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from db import db
+from models.agent import Agent
+from models.bank import Bank
+from models.user import User
+
+# Read-only snapshots of the public columns of identity rows. They expose the
+# same attribute names as the models, so read paths can use them in place of
+# ORM instances; write paths (register, password rotation) must load the ORM
+# row and invalidate. Password hashes and KDF salts are never cached (see
+# user_salt/bank_salt): a cached hash keeps accepting a rotated-out password
+# in other workers until it expires, and the shared backend would hold them.
+UserRecord = namedtuple("UserRecord", "id user_name")
+BankRecord = namedtuple("BankRecord", "id bank_id bank_name")
+AgentRecord = namedtuple("AgentRecord", "id agent_id agent_name")
+
+class LocalBackend:
+    """
+    In-process LRU with per-entry TTL. Also the stand-in for the shared
+    backend in development and tests.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    """
+    Shared backend so every worker sees the same entries and invalidations.
+    Records are stored as JSON (bytes fields base64-encoded).
+    """
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed with IDENTITY_CACHE_BACKEND=redis
+        self._redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _encode(value):
+        def field(v):
+            return {"b64": base64.b64encode(v).decode()} if isinstance(v, bytes) else v
+        if isinstance(value, list):
+            return json.dumps({"t": type(value[0]).__name__ if value else None, "rows": [[field(v) for v in r] for r in value]})
+        return json.dumps({"t": type(value).__name__, "row": [field(v) for v in value]})
+
+    @staticmethod
+    def _decode(raw):
+        def field(v):
+            return base64.b64decode(v["b64"]) if isinstance(v, dict) else v
+        data = json.loads(raw)
+        record = _RECORD_TYPES.get(data["t"])
+        try:
+            if "rows" in data:
+                return [record(*[field(v) for v in r]) for r in data["rows"]]
+            return record(*[field(v) for v in data["row"]])
+        except TypeError:
+            return None  # written with an older record layout: a miss
+
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return None if raw is None else self._decode(raw)
+
+    def set(self, key, value, ttl: float):
+        self._redis.set(key, self._encode(value), px=int(ttl * 1000))
+
+    def delete(self, *keys):
+        if keys:
+            self._redis.delete(*keys)
+
+    def size(self) -> int:
+        return self._redis.dbsize()
+
+_RECORD_TYPES = {t.__name__: t for t in (UserRecord, BankRecord, AgentRecord)}
+
+class IdentityCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def _count(self, counters: dict, namespace: str):
+        with self._lock:
+            counters[namespace] = counters.get(namespace, 0) + 1
+
+    def fetch(self, namespace: str, key: str, loader):
+        """
+        Read-through: return the cached value or call loader() and cache it.
+        Misses (None) are not cached, so new rows are visible immediately.
+        """
+        full_key = f"identity:{namespace}:{key}"
+        value = self.backend.get(full_key)
+        if value is not None:
+            self._count(self.hits, namespace)
+            return value
+        self._count(self.misses, namespace)
+        value = loader()
+        if value is not None:
+            self.backend.set(full_key, value, self.ttl)
+        return value
+
+    def invalidate(self, *namespaced_keys):
+        self.backend.delete(*(f"identity:{ns}:{key}" for ns, key in namespaced_keys))
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = sorted(set(self.hits) | set(self.misses))
+            per_ns = {}
+            for ns in namespaces:
+                hits, misses = self.hits.get(ns, 0), self.misses.get(ns, 0)
+                per_ns[ns] = {"hits": hits, "misses": misses, "hitRate": round(hits / (hits + misses), 4)}
+        return {"backend": type(self.backend).__name__, "entries": self.backend.size(), "ttl": self.ttl, "namespaces": per_ns}
+
+def _cache() -> IdentityCache:
+    app = current_app._get_current_object()
+    cache = app.extensions.get("identity_cache")
+    if cache is None:
+        if app.config["IDENTITY_CACHE_BACKEND"] == "redis":
+            backend = RedisBackend(app.config["IDENTITY_CACHE_URL"])
+        else:
+            backend = LocalBackend(app.config["IDENTITY_CACHE_MAX_ENTRIES"])
+        cache = app.extensions.setdefault("identity_cache", IdentityCache(backend, app.config["IDENTITY_CACHE_TTL"]))
+    return cache
+
+def _user_record(u):
+    return UserRecord(u.id, u.user_name) if u else None
+
+def _bank_record(b):
+    return BankRecord(b.id, b.bank_id, b.bank_name) if b else None
+
+def get_user_by_name(user_name: str):
+    return _cache().fetch("user", user_name, lambda: _user_record(User.query.filter_by(user_name=user_name).first()))
+
+def get_user_by_id(user_pk: int):
+    return _cache().fetch("user-pk", str(user_pk), lambda: _user_record(db.session.get(User, user_pk)))
+
+def get_bank(bank_id: str):
+    return _cache().fetch("bank", bank_id, lambda: _bank_record(Bank.query.filter_by(bank_id=bank_id).first()))
+
+def get_agent(agent_id: str):
+    def load():
+        a = Agent.query.filter_by(agent_id=agent_id).first()
+        return AgentRecord(a.id, a.agent_id, a.agent_name) if a else None
+    return _cache().fetch("agent", agent_id, load)
+
+def list_banks():
+    return _cache().fetch("banks", "all", lambda: [_bank_record(b) for b in Bank.query.all()] or None) or []
+
+def list_agents():
+    return _cache().fetch("agents", "all", lambda: [AgentRecord(a.id, a.agent_id, a.agent_name) for a in Agent.query.all()] or None) or []
+
+def user_salt(user_pk: int) -> bytes:
+    """The user's KDF salt, read from the database (not cached)."""
+    return db.session.query(User.salt).filter(User.id == user_pk).scalar()
+
+def bank_salt(bank_pk: int) -> bytes:
+    """The bank's KDF salt, read from the database (not cached)."""
+    return db.session.query(Bank.salt).filter(Bank.id == bank_pk).scalar()
+
+def invalidate_user(user):
+    _cache().invalidate(("user", user.user_name), ("user-pk", str(user.id)))
+
+def invalidate_bank(bank):
+    _cache().invalidate(("bank", bank.bank_id), ("banks", "all"))
+
+def invalidate_banks():
+    _cache().invalidate(("banks", "all"))
+
+def invalidate_agents():
+    _cache().invalidate(("agents", "all"))
+
+def identity_cache_stats() -> dict:
+    return _cache().stats()
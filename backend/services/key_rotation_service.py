@@ -0,0 +1,174 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from models.key_rotation import KeyRotation
+from models.loan_head import LoanHead
+from models.encrypted_key import EncryptedKey
+from services.encryption_service import kdf_key, encrypt_dek_for_party, decrypt_dek_for_party
+from services.password_service import hash_password
+from utils.sharding import shard_indexes, use_shard
+from db import db
+
+# EncryptedKey columns holding the wrapped DEK for each party
+ROTATION_COLUMNS = {
+    "user": ("dek_cipher_for_user", "dek_nonce_for_user"),
+    "bank": ("dek_cipher_for_bank", "dek_nonce_for_bank"),
+}
+# Model attribute holding each party's bcrypt password hash
+PASSWORD_HASH_ATTRS = {"user": "password_hash", "bank": "bank_password_hash"}
+
+# Loans initiated this long before the rotation marker appeared are swept a
+# second time: their keys may have been committed after the first pass
+# passed them by.
+CATCH_UP_MARGIN = datetime.timedelta(minutes=5)
+
+class RotationInProgressError(Exception):
+    """A password rotation for the user or bank is running; retry later."""
+
+def _fresh_since() -> datetime.datetime:
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=current_app.config["ROTATION_STALE_AFTER"])
+
+def _marker(party: str, party_pk: int):
+    return and_(KeyRotation.party == party, KeyRotation.party_id == party_pk)
+
+def rotation_in_progress(user_pk: int, bank_pk: int) -> bool:
+    """True while a live rotation holds the marker of either party of a new loan."""
+    return db.session.scalar(
+        select(KeyRotation.party)
+        .where(or_(_marker("user", user_pk), _marker("bank", bank_pk)), KeyRotation.heartbeat_at >= _fresh_since())
+        .limit(1)
+    ) is not None
+
+@contextmanager
+def _rotation_marker(party: str, party_pk: int):
+    """
+    Hold the party's rotation marker (a key_rotations row) for the block and
+    yield its start time. A marker left behind by a crashed rotation is taken
+    over; a live one raises RotationInProgressError.
+    """
+    now = datetime.datetime.utcnow()
+    db.session.execute(delete(KeyRotation).where(_marker(party, party_pk), KeyRotation.heartbeat_at < _fresh_since()))
+    db.session.add(KeyRotation(party=party, party_id=party_pk, started_at=now, heartbeat_at=now))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise RotationInProgressError(f"A password rotation for this {party} is already running")
+    try:
+        yield now
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(KeyRotation).where(_marker(party, party_pk)))
+        db.session.commit()
+
+def _rewrap_dek(row, old_key: bytes, new_key: bytes):
+    """
+    Re-wrap a single DEK from old_key to new_key.
+    Returns (status, rewrapped) where status is 'rotated', 'skipped' (already
+    wrapped with new_key by an earlier, interrupted run) or 'failed'.
+    """
+    from cryptography.exceptions import InvalidTag
+
+    row_id, cipher, nonce = row
+    try:
+        dek = decrypt_dek_for_party(cipher, nonce, old_key)
+    except InvalidTag:
+        try:
+            decrypt_dek_for_party(cipher, nonce, new_key)
+            return "skipped", None
+        except InvalidTag:
+            return "failed", None
+
+    new_cipher, new_nonce = encrypt_dek_for_party(dek, new_key)
+    return "rotated", (row_id, new_cipher, new_nonce)
+
+def rotate_party_password(party: str, party_row, old_password: str, new_password: str) -> dict:
+    """
+    Re-wrap every DEK owned by a user or bank under a key derived from
+    new_password, then swap the party's password hash.
+
+    - Old and new keys are derived once (same KDF salt)
+    - EncryptedKey rows are streamed in id order, ROTATION_BATCH_SIZE at a time,
+      one ledger shard after another
+    - Each batch is re-wrapped in a thread pool and committed on its own,
+      so no long-running transaction holds locks on encrypted_keys
+    - While it runs, a key_rotations marker makes new loans of the party wait
+      (RotationInProgressError); loans initiated just before it appeared are
+      swept again before the hash is swapped
+    - Rows already wrapped with the new key are skipped, so an interrupted
+      rotation is resumed by calling this again with the same passwords
+    - DEKs that neither password opens (e.g. a loan initiated with a mistyped
+      password) cannot be rotated; they are reported in failedLoans and do
+      not hold back the rest
+    Raises RotationInProgressError if another rotation of the party is running.
+    """
+    old_key = kdf_key(old_password, party_row.salt, current_app.config['KDF_ITERATIONS'])
+    new_key = kdf_key(new_password, party_row.salt, current_app.config['KDF_ITERATIONS'])
+
+    owner_col = LoanHead.user_id if party == "user" else LoanHead.bank_id
+    # loan_heads also covers archived loans, whose blocks have left blockchain_blocks
+    owned_loans = db.session.query(LoanHead.loan_id).filter(owner_col == party_row.id)
+    summary = {"rotated": 0, "skipped": 0, "failed": 0}
+    failed_loans = set()
+
+    with _rotation_marker(party, party_row.id) as started, \
+            ThreadPoolExecutor(max_workers=current_app.config["ROTATION_WORKERS"]) as pool:
+        for shard in shard_indexes():
+            with use_shard(shard):
+                _rotate_shard(pool, party, party_row.id, owned_loans, old_key, new_key, summary, failed_loans)
+
+        # hashing here (bcrypt) also gives loans that were already being
+        # written when the marker appeared time to commit before the catch-up
+        new_hash = hash_password(new_password)
+        recent_loans = owned_loans.filter(LoanHead.initiated_at >= started - CATCH_UP_MARGIN)
+        catch_up = {"rotated": 0, "skipped": 0, "failed": 0}
+        for shard in shard_indexes():
+            with use_shard(shard):
+                _rotate_shard(pool, party, party_row.id, recent_loans, old_key, new_key, catch_up, failed_loans)
+        summary["rotated"] += catch_up["rotated"]
+        summary["failed"] = len(failed_loans)
+
+        setattr(party_row, PASSWORD_HASH_ATTRS[party], new_hash)
+        db.session.commit()
+
+    summary["failedLoans"] = sorted(failed_loans)
+    return summary
+
+def _rotate_shard(pool, party, party_pk, owned_loans, old_key, new_key, summary, failed_loans):
+    cipher_attr, nonce_attr = ROTATION_COLUMNS[party]
+    cipher_col = getattr(EncryptedKey, cipher_attr)
+    nonce_col = getattr(EncryptedKey, nonce_attr)
+    batch_size = current_app.config["ROTATION_BATCH_SIZE"]
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(EncryptedKey.id, cipher_col, nonce_col, EncryptedKey.loan_id)
+            .filter(EncryptedKey.id > last_id, EncryptedKey.loan_id.in_(owned_loans))
+            .order_by(EncryptedKey.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        results = pool.map(lambda r: _rewrap_dek(r[:3], old_key, new_key), rows)
+        for row, (status, rewrapped) in zip(rows, results):
+            summary[status] += 1
+            if status == "failed":
+                failed_loans.add(row[3])
+            if rewrapped:
+                row_id, new_cipher, new_nonce = rewrapped
+                updates.append({"id": row_id, cipher_attr: new_cipher, nonce_attr: new_nonce})
+
+        if updates:
+            db.session.bulk_update_mappings(EncryptedKey, updates)
+        # keep the rotation marker fresh; it commits with the batch
+        db.session.execute(
+            update(KeyRotation).where(_marker(party, party_pk)).values(heartbeat_at=datetime.datetime.utcnow())
+        )
+        db.session.commit()
@@ -0,0 +1,127 @@
+import datetime, heapq
+from collections import namedtuple
+from sqlalchemy import and_, or_
+from models.archived_loan import ArchivedLoan
+from models.block import Block
+from models.loan_head import LoanHead
+from services.identity_cache_service import get_user_by_id, list_banks, list_agents
+from utils.sharding import shard_indexes, use_shard
+from db import db
+
+# A search hit, with party public ids resolved from the identity cache
+# (identity tables live on the primary, loan_heads on every ledger shard)
+SearchRow = namedtuple("SearchRow", "loan_id current_status tip_hash height initiated_at updated_at user_name bank_id agent_id")
+
+def encode_cursor(initiated_at: datetime.datetime, loan_id: str) -> str:
+    return f"{initiated_at.isoformat()}|{loan_id}"
+
+def decode_cursor(cursor: str):
+    ts, loan_id = cursor.split("|", 1)
+    return datetime.datetime.fromisoformat(ts), loan_id
+
+def search_loans(user_id=None, bank_id=None, agent_id=None, status=None, since=None, until=None, cursor=None, limit=50):
+    """
+    Keyset-paginated search over loan_heads, newest first.
+    Each filter combination is served by one of the LoanHead composite indexes
+    (leading equality columns, then initiated_at, loan_id for range + order).
+    Every shard returns its first limit + 1 matches and the pages are merged,
+    so the cursor stays a global (initiated_at, loan_id) position.
+    Returns (rows, next_cursor).
+    """
+    q = db.session.query(
+        LoanHead.loan_id, LoanHead.current_status, LoanHead.tip_hash, LoanHead.height,
+        LoanHead.initiated_at, LoanHead.updated_at,
+        LoanHead.user_id, LoanHead.bank_id, LoanHead.agent_id
+    )
+    if user_id is not None:
+        q = q.filter(LoanHead.user_id == user_id)
+    if bank_id is not None:
+        q = q.filter(LoanHead.bank_id == bank_id)
+    if agent_id is not None:
+        q = q.filter(LoanHead.agent_id == agent_id)
+    if status is not None:
+        q = q.filter(LoanHead.current_status == status)
+    if since is not None:
+        q = q.filter(LoanHead.initiated_at >= since)
+    if until is not None:
+        q = q.filter(LoanHead.initiated_at < until)
+    if cursor is not None:
+        c_ts, c_loan = decode_cursor(cursor)
+        q = q.filter(or_(
+            LoanHead.initiated_at < c_ts,
+            and_(LoanHead.initiated_at == c_ts, LoanHead.loan_id < c_loan)
+        ))
+
+    q = q.order_by(LoanHead.initiated_at.desc(), LoanHead.loan_id.desc()).limit(limit + 1)
+
+    pages = []
+    for shard in shard_indexes():
+        with use_shard(shard):
+            pages.append(q.all())
+    rows = list(heapq.merge(*pages, key=lambda r: (r.initiated_at, r.loan_id), reverse=True))[:limit + 1]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].initiated_at, rows[-1].loan_id)
+
+    banks = {b.id: b.bank_id for b in list_banks()}
+    agents = {a.id: a.agent_id for a in list_agents()}
+    return [SearchRow(r.loan_id, r.current_status, r.tip_hash, r.height, r.initiated_at, r.updated_at,
+                      getattr(get_user_by_id(r.user_id), "user_name", None), banks.get(r.bank_id), agents.get(r.agent_id))
+            for r in rows], next_cursor
+
+def rebuild_loan_heads(batch_size: int = 5000) -> int:
+    """
+    Recompute loan_heads from blockchain_blocks (for existing data or after
+    repair). Walks loans in loan_id order, batch_size loans per query, and
+    bulk-inserts their heads; archived loans get theirs from the archive
+    summary. Returns the number of loans written.
+    """
+    db.session.query(LoanHead).delete()
+    written, last_loan = 0, ""
+    while True:
+        loan_ids = [
+            loan_id for (loan_id,) in db.session.query(Block.loan_id)
+            .filter(Block.loan_id > last_loan).distinct()
+            .order_by(Block.loan_id).limit(batch_size)
+        ]
+        if not loan_ids:
+            break
+        last_loan = loan_ids[-1]
+
+        rows = (
+            db.session.query(Block.loan_id, Block.user_id, Block.bank_id, Block.agent_id,
+                             Block.transaction_data, Block.current_hash, Block.created_at)
+            .filter(Block.loan_id.in_(loan_ids))
+            .order_by(Block.loan_id, Block.created_at, Block.id)
+        )
+        heads = {}
+        for loan_id, user_id, bank_id, agent_id, status, current_hash, created_at in rows:
+            head = heads.get(loan_id)
+            if head is None:
+                head = heads[loan_id] = {"loan_id": loan_id, "user_id": user_id, "bank_id": bank_id,
+                                         "agent_id": agent_id, "height": 0, "initiated_at": created_at}
+            head.update(current_status=status, tip_hash=current_hash, updated_at=created_at)
+            head["height"] += 1
+
+        db.session.bulk_insert_mappings(LoanHead, list(heads.values()))
+        written += len(heads)
+
+    archived = db.session.query(
+        ArchivedLoan.loan_id, ArchivedLoan.user_id, ArchivedLoan.bank_id, ArchivedLoan.agent_id,
+        ArchivedLoan.final_status, ArchivedLoan.final_hash, ArchivedLoan.height,
+        ArchivedLoan.initiated_at, ArchivedLoan.finished_at
+    ).yield_per(batch_size)
+    batch = []
+    for a in archived:
+        batch.append({"loan_id": a.loan_id, "user_id": a.user_id, "bank_id": a.bank_id, "agent_id": a.agent_id,
+                      "current_status": a.final_status, "tip_hash": a.final_hash, "height": a.height,
+                      "initiated_at": a.initiated_at, "updated_at": a.finished_at})
+        if len(batch) == batch_size:
+            db.session.bulk_insert_mappings(LoanHead, batch)
+            written, batch = written + len(batch), []
+    db.session.bulk_insert_mappings(LoanHead, batch)
+    written += len(batch)
+    db.session.commit()
+    return written
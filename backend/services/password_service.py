@@ -0,0 +1,9 @@
+# bcrypt is imported lazily; see encryption_service for the rationale.
+
+def hash_password(password: str) -> str:
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def check_password(password: str, password_hash: str) -> bool:
+    import bcrypt
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
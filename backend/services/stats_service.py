@@ -0,0 +1,129 @@
+import datetime
+from sqlalchemy import func
+from models.block import Block
+from models.loan_head import LoanHead
+from models.loan_stats import LoanStatusCount, LoanDailyTransition
+from services.archive_service import archived_daily_counts
+from utils.sharding import shard_indexes, use_shard
+from db import db
+
+def _bump(model, key: dict, delta: int):
+    """
+    Atomically add delta to model.count for the given key row, creating it if
+    missing. Uses the dialect's native upsert so concurrent writers never lose
+    an increment.
+    """
+    dialect = db.session.get_bind(mapper=model).dialect.name
+    values = {**key, "count": delta}
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(**values)
+        stmt = stmt.on_duplicate_key_update(count=model.count + stmt.inserted.count)
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(model).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key), set_={"count": model.count + stmt.excluded.count})
+    db.session.execute(stmt)
+
+def _apply(bumps):
+    """
+    Run _bump for each (model, key, delta) in one fixed order (table, then
+    key). Every writer then takes the counter row locks in the same order, so
+    two transitions moving loans of a bank in opposite directions (paid ->
+    unpaid and unpaid -> paid) cannot deadlock on each other's rows.
+    """
+    for model, key, delta in sorted(bumps, key=lambda b: (b[0].__tablename__, tuple(b[1].values()))):
+        _bump(model, key, delta)
+
+def record_genesis(bank_pk: int, when: datetime.datetime):
+    _apply([
+        (LoanStatusCount, {"bank_id": bank_pk, "status": "initiated"}, 1),
+        (LoanDailyTransition, {"day": when.date(), "bank_id": bank_pk, "status": "initiated"}, 1),
+    ])
+
+def record_transition(bank_pk: int, old_status: str, new_status: str, when: datetime.datetime):
+    bumps = [(LoanDailyTransition, {"day": when.date(), "bank_id": bank_pk, "status": new_status}, 1)]
+    if old_status != new_status:
+        bumps += [
+            (LoanStatusCount, {"bank_id": bank_pk, "status": old_status}, -1),
+            (LoanStatusCount, {"bank_id": bank_pk, "status": new_status}, 1),
+        ]
+    _apply(bumps)
+
+def bank_stats(bank_pk: int, days: int) -> dict:
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    counts, daily = [], []
+    for shard in shard_indexes():  # each shard counts its own loans
+        with use_shard(shard):
+            counts += db.session.query(LoanStatusCount.status, LoanStatusCount.count).filter(LoanStatusCount.bank_id == bank_pk).all()
+            daily += (
+                db.session.query(LoanDailyTransition.day, LoanDailyTransition.status, LoanDailyTransition.count)
+                .filter(LoanDailyTransition.bank_id == bank_pk, LoanDailyTransition.day >= since)
+                .all()
+            )
+    return _shape(counts, daily)
+
+def global_stats(days: int) -> dict:
+    """Portfolio-wide totals only: per-bank counts are served to each bank by bank_stats."""
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    counts, daily = [], []
+    for shard in shard_indexes():
+        with use_shard(shard):
+            counts += (
+                db.session.query(LoanStatusCount.status, func.sum(LoanStatusCount.count))
+                .group_by(LoanStatusCount.status)
+                .all()
+            )
+            daily += (
+                db.session.query(LoanDailyTransition.day, LoanDailyTransition.status, func.sum(LoanDailyTransition.count))
+                .filter(LoanDailyTransition.day >= since)
+                .group_by(LoanDailyTransition.day, LoanDailyTransition.status)
+                .all()
+            )
+    return _shape(counts, daily)
+
+def _shape(counts, daily) -> dict:
+    # rows may repeat a key once per shard, so counts are summed
+    by_status = {}
+    for status, count in counts:
+        if count:
+            by_status[status] = by_status.get(status, 0) + int(count)
+    transitions = {}
+    for day, status, count in sorted(daily, key=lambda row: row[0]):
+        per_day = transitions.setdefault(day.isoformat(), {})
+        per_day[status] = per_day.get(status, 0) + int(count)
+    return {"byStatus": by_status, "total": sum(by_status.values()), "dailyTransitions": transitions}
+
+def rebuild_stats():
+    """
+    Recompute both counter tables: current status per loan from loan_heads,
+    daily volumes by grouping every block (live and archived) on its creation date.
+    """
+    db.session.query(LoanStatusCount).delete()
+    db.session.query(LoanDailyTransition).delete()
+
+    counts = (
+        db.session.query(LoanHead.bank_id, LoanHead.current_status, func.count())
+        .group_by(LoanHead.bank_id, LoanHead.current_status)
+    )
+    db.session.bulk_insert_mappings(LoanStatusCount, [
+        {"bank_id": bank_pk, "status": status, "count": count} for bank_pk, status, count in counts
+    ])
+
+    day_col = func.date(Block.created_at)
+    daily = (
+        db.session.query(day_col, Block.bank_id, Block.transaction_data, func.count())
+        .group_by(day_col, Block.bank_id, Block.transaction_data)
+    )
+    totals = archived_daily_counts()
+    for day, bank_pk, status, count in daily:
+        day = datetime.date.fromisoformat(day) if isinstance(day, str) else day
+        totals[(day, bank_pk, status)] += count
+    db.session.bulk_insert_mappings(LoanDailyTransition, [
+        {"day": day, "bank_id": bank_pk, "status": status, "count": count}
+        for (day, bank_pk, status), count in totals.items()
+    ])
+    db.session.commit()
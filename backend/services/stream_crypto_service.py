@@ -0,0 +1,98 @@
+import hashlib, os
+from models.metadata_chunk import MetadataChunk
+from db import db
+
+# chunked-v1: STREAM-style AES-256-GCM over fixed-size plaintext chunks.
+#   nonce_i = prefix (7 random bytes) || i (4 bytes, big endian) || last flag (1 byte)
+#   aad     = loan_id
+# The counter pins each chunk's position and the last flag marks the final
+# chunk, so reordering, dropping or truncating chunks fails authentication.
+# The block stores a manifest instead of the ciphertext:
+#   chunked-v1:<chunks>:<plaintext bytes>:<sha256 of all chunk ciphertexts>
+# which keeps compute_block_hash binding the full payload.
+MANIFEST_PREFIX = "chunked-v1"
+NONCE_PREFIX_LEN = 7
+
+def is_chunked(metadata_ciphertext: str) -> bool:
+    return metadata_ciphertext.startswith(MANIFEST_PREFIX + ":")
+
+def parse_manifest(manifest: str):
+    _, chunks, size, digest = manifest.split(":")
+    return int(chunks), int(size), digest
+
+def _nonce(prefix: bytes, seq: int, last: bool) -> bytes:
+    return prefix + seq.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+def store_encrypted_stream(stream, loan_id: str, dek: bytes, chunk_size: int):
+    """
+    Read stream chunk_size bytes at a time, seal each chunk and insert it
+    straight away, so only ~two chunks are held in memory whatever the
+    payload size. Each insert is committed on its own: no write transaction
+    (on SQLite, the shard's write lock) stays open while a slow client
+    uploads. Callers delete the chunks (delete_stream_chunks) if the loan is
+    not written after all. Returns (manifest, nonce_prefix).
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    aesgcm = AESGCM(dek)
+    prefix = os.urandom(NONCE_PREFIX_LEN)
+    aad = loan_id.encode("utf-8")
+    digest = hashlib.sha256()
+    insert = MetadataChunk.__table__.insert()
+
+    seq, size = 0, 0
+    current = stream.read(chunk_size)
+    while True:
+        # read one chunk ahead to know whether `current` is the last one
+        following = stream.read(chunk_size) if current else b""
+        last = not following
+        ct = aesgcm.encrypt(_nonce(prefix, seq, last), current, aad)
+        digest.update(ct)
+        db.session.execute(insert, {"loan_id": loan_id, "seq": seq, "ciphertext": ct})
+        db.session.commit()
+        size += len(current)
+        seq += 1
+        if last:
+            break
+        current = following
+
+    return f"{MANIFEST_PREFIX}:{seq}:{size}:{digest.hexdigest()}", prefix
+
+def delete_stream_chunks(loan_id: str):
+    """Remove the sealed chunks of a loan whose genesis block was not written."""
+    db.session.execute(MetadataChunk.__table__.delete().where(MetadataChunk.loan_id == loan_id))
+
+def iter_decrypted_stream(loan_id: str, manifest: str, prefix: bytes, dek: bytes, page_size: int = 16):
+    """
+    Yield plaintext chunks, fetching page_size sealed chunks per query.
+    Raises ValueError if chunks are missing, extra or do not match the manifest.
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    chunks, _, expected_digest = parse_manifest(manifest)
+    aesgcm = AESGCM(dek)
+    aad = loan_id.encode("utf-8")
+    digest = hashlib.sha256()
+
+    seq = 0
+    while seq < chunks:
+        remaining = chunks - seq
+        rows = (
+            db.session.query(MetadataChunk.seq, MetadataChunk.ciphertext)
+            .filter(MetadataChunk.loan_id == loan_id, MetadataChunk.seq >= seq)
+            .order_by(MetadataChunk.seq)
+            # the last page looks one row past the end, to catch extra chunks
+            .limit(remaining + 1 if remaining <= page_size else page_size)
+            .all()
+        )
+        if not rows:
+            raise ValueError("Metadata chunks missing")
+        for row_seq, ct in rows:
+            if row_seq != seq or seq >= chunks:
+                raise ValueError("Metadata chunks out of sequence")
+            digest.update(ct)
+            yield aesgcm.decrypt(_nonce(prefix, seq, seq == chunks - 1), ct, aad)
+            seq += 1
+
+    if digest.hexdigest() != expected_digest:
+        raise ValueError("Metadata chunks do not match manifest")
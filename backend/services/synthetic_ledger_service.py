@@ -0,0 +1,154 @@
+import datetime, json, os, random, time, uuid
+from flask import current_app
+from models.agent import Agent
+from models.bank import Bank
+from models.block import Block
+from models.encrypted_key import EncryptedKey
+from models.loan_head import LoanHead
+from models.user import User
+from services.encryption_service import kdf_key, encrypt_json_with_dek, encrypt_dek_for_party
+from services.hashing_service import compute_block_hash
+from services.identity_cache_service import invalidate_agents, invalidate_banks
+from services.password_service import hash_password
+from utils.sharding import shard_of, shard_count, use_shard
+from db import db
+
+GENESIS_PREVIOUS_HASH = "0" * 64
+
+class ChainShape:
+    """
+    Distribution knobs for generated transition chains:
+    initiated -> accepted? -> (paid|unpaid)* -> completed? -> closed?
+    """
+
+    def __init__(self, accept_rate=0.85, mean_payments=6.0, unpaid_rate=0.1, complete_rate=0.5, close_rate=0.6, max_gap_days=30):
+        self.accept_rate = accept_rate
+        self.mean_payments = mean_payments
+        self.unpaid_rate = unpaid_rate
+        self.complete_rate = complete_rate
+        self.close_rate = close_rate
+        self.max_gap_days = max_gap_days
+
+    def statuses(self, rng: random.Random):
+        if rng.random() >= self.accept_rate:
+            return []
+        chain = ["accepted"]
+        payments = int(rng.expovariate(1 / self.mean_payments)) if self.mean_payments > 0 else 0
+        chain += ["unpaid" if rng.random() < self.unpaid_rate else "paid" for _ in range(payments)]
+        if rng.random() < self.complete_rate:
+            chain.append("completed")
+            if rng.random() < self.close_rate:
+                chain.append("closed")
+        return chain
+
+def _metadata(rng: random.Random, user_name: str) -> str:
+    return json.dumps({
+        "applicant": user_name,
+        "loanType": rng.choice(["personal", "home", "auto", "education", "business"]),
+        "amount": rng.randrange(10_000, 5_000_000, 500),
+        "tenureMonths": rng.choice([6, 12, 24, 36, 60, 120, 240]),
+        "monthlyIncome": rng.randrange(15_000, 500_000, 1000),
+        "purpose": rng.choice(["renovation", "vehicle", "tuition", "working capital", "medical", "travel"]),
+    })
+
+def _insert_parties(model, rows, key_col, batch_size):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[i:i + batch_size])
+    db.session.commit()
+    keys = [r[key_col] for r in rows]
+    col = getattr(model, key_col)
+    ids = {}
+    for i in range(0, len(keys), batch_size):
+        ids.update(db.session.query(col, model.id).filter(col.in_(keys[i:i + batch_size])))
+    return ids
+
+def generate_ledger(users: int, banks: int, agents: int, loans: int, shape: ChainShape, days: int = 365,
+                    password: str = "password", kdf_iterations: int = None, seed: int = None,
+                    batch_size: int = 2000, prefix: str = None, progress=None) -> dict:
+    """
+    Bulk-generate parties, loans and transition chains straight into the DB.
+
+    Every party gets the same password, so one bcrypt hash is reused and only
+    one PBKDF2 derivation per party is needed; per-loan work is AES-GCM and
+    SHA-256. Blocks carry valid compute_block_hash chains, loan_heads rows are
+    written alongside, and portfolio counters should be rebuilt afterwards.
+    Rows are inserted with Core executemany, batch_size loans per commit,
+    each loan's rows on its ledger shard.
+    """
+    rng = random.Random(seed)
+    prefix = prefix or f"syn{uuid.uuid4().hex[:6]}"
+    iterations = kdf_iterations or current_app.config['KDF_ITERATIONS']
+    app_salt = current_app.config['APP_HASH_SALT']
+    codec = current_app.config['METADATA_CODEC']
+    min_size = current_app.config['METADATA_COMPRESS_MIN_SIZE']
+    started = time.perf_counter()
+
+    password_hash = hash_password(password)
+    user_rows = [{"user_name": f"{prefix}-user-{i}", "password_hash": password_hash, "salt": os.urandom(16)} for i in range(users)]
+    bank_rows = [{"bank_id": f"{prefix}-bank-{i}", "bank_name": f"{prefix.upper()} Bank {i}", "bank_password_hash": password_hash, "salt": os.urandom(16)} for i in range(banks)]
+    agent_rows = [{"agent_id": f"{prefix}-agent-{i}", "agent_name": f"Agent {i}"} for i in range(agents)]
+
+    user_ids = _insert_parties(User, user_rows, "user_name", batch_size)
+    bank_ids = _insert_parties(Bank, bank_rows, "bank_id", batch_size)
+    agent_ids = list(_insert_parties(Agent, agent_rows, "agent_id", batch_size).values()) if agents else []
+    # new parties have no per-key entries yet (misses are not cached), only the lists are stale
+    invalidate_banks()
+    invalidate_agents()
+
+    # (pk, wrapping key) per party: one KDF each
+    user_keys = [(user_ids[r["user_name"]], r["user_name"], kdf_key(password, r["salt"], iterations)) for r in user_rows]
+    bank_keys = [(bank_ids[r["bank_id"]], r["bank_name"], kdf_key(password, r["salt"], iterations)) for r in bank_rows]
+
+    now = datetime.datetime.utcnow()
+    span = datetime.timedelta(days=days)
+    block_insert, key_insert, head_insert = Block.__table__.insert(), EncryptedKey.__table__.insert(), LoanHead.__table__.insert()
+    total_blocks = 0
+
+    for start in range(0, loans, batch_size):
+        per_shard = [([], [], []) for _ in range(shard_count())]
+        for _ in range(min(batch_size, loans - start)):
+            loan_id = uuid.uuid4().hex[:16]
+            blocks, keys, heads = per_shard[shard_of(loan_id)]
+            user_pk, user_name, user_key = rng.choice(user_keys)
+            bank_pk, bank_name, bank_key = rng.choice(bank_keys)
+            agent_pk = rng.choice(agent_ids) if agent_ids else None
+
+            dek = os.urandom(32)
+            cipher, nonce = encrypt_json_with_dek(_metadata(rng, user_name), dek, codec=codec, min_size=min_size)
+            dek_cipher_user, dek_nonce_user = encrypt_dek_for_party(dek, user_key)
+            dek_cipher_bank, dek_nonce_bank = encrypt_dek_for_party(dek, bank_key)
+            keys.append({"loan_id": loan_id, "dek_cipher_for_user": dek_cipher_user, "dek_nonce_for_user": dek_nonce_user,
+                         "dek_cipher_for_bank": dek_cipher_bank, "dek_nonce_for_bank": dek_nonce_bank, "created_at": now})
+
+            created = now - span * rng.random()
+            initiated_at, previous_hash, nonce_hex = created, GENESIS_PREVIOUS_HASH, nonce.hex()
+            chain = ["initiated"] + shape.statuses(rng)
+            for status in chain:
+                block_hash = compute_block_hash(cipher, status, previous_hash, loan_id, nonce_hex, created.isoformat(), app_salt)
+                blocks.append({"loan_id": loan_id, "user_id": user_pk, "bank_id": bank_pk, "agent_id": agent_pk,
+                               "metadata_ciphertext": cipher, "metadata_nonce": nonce, "transaction_data": status,
+                               "previous_hash": previous_hash, "current_hash": block_hash, "bank_name_public": bank_name,
+                               "created_at": created, "updated_at": created})
+                previous_hash = block_hash
+                created = min(now, created + datetime.timedelta(seconds=rng.uniform(3600, shape.max_gap_days * 86400)))
+
+            heads.append({"loan_id": loan_id, "user_id": user_pk, "bank_id": bank_pk, "agent_id": agent_pk,
+                          "current_status": chain[-1], "tip_hash": previous_hash, "height": len(chain),
+                          "initiated_at": initiated_at, "updated_at": blocks[-1]["created_at"]})
+
+        done = 0
+        for shard, (blocks, keys, heads) in enumerate(per_shard):
+            if not heads:
+                continue
+            with use_shard(shard):
+                db.session.execute(key_insert, keys)
+                db.session.execute(block_insert, blocks)
+                db.session.execute(head_insert, heads)
+                db.session.commit()
+            total_blocks += len(blocks)
+            done += len(heads)
+        if progress:
+            progress(start + done, loans, total_blocks)
+
+    return {"prefix": prefix, "users": users, "banks": banks, "agents": agents, "loans": loans,
+            "blocks": total_blocks, "kdfIterations": iterations, "seconds": round(time.perf_counter() - started, 1)}
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from db import db  # noqa: E402
+
+
+def build_app(directory, shards: int = 1, **overrides):
+    """
+    An app on fresh SQLite files in directory (the primary plus shards - 1
+    ledger shards) with the schema created by `flask init-db`. Keyword
+    arguments override config values.
+    """
+    uris = [f"sqlite:///{directory / f'shard{i}.db'}" for i in range(shards)]
+    settings = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=uris[0],
+        LEDGER_SHARD_URIS=uris[1:],
+        SQLALCHEMY_BINDS={f"shard{i}": uri for i, uri in enumerate(uris[1:], start=1)},
+        JWT_SECRET="test-secret-of-at-least-thirty-two-bytes",
+        KDF_ITERATIONS=1000,
+        ADMISSION_ENABLED=False,
+        GROUP_COMMIT_ENABLED=False,
+    )
+    settings.update(overrides)
+    app = create_app(type("TestConfig", (Config,), settings))
+    result = app.test_cli_runner().invoke(args=["init-db"])
+    assert result.exit_code == 0, result.output
+    return app
+
+
+def dispose(app):
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Factory fixture around build_app; each app gets its own directory."""
+    apps = []
+
+    def factory(shards: int = 1, **overrides):
+        directory = tmp_path / f"app{len(apps)}"
+        directory.mkdir()
+        apps.append(build_app(directory, shards, **overrides))
+        return apps[-1]
+
+    yield factory
+    for app in apps:
+        dispose(app)
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register_bank(client, bank_id: str, password: str = "bank-pw") -> dict:
+    """Register a bank and return bearer headers for it."""
+    resp = client.post("/banks/register", json={"bankId": bank_id, "bankName": bank_id.upper(), "bankPassword": password})
+    assert resp.status_code == 200, resp.get_json()
+    return {"Authorization": f"Bearer {resp.get_json()['token']}"}
+
+
+def register_user(client, user_name: str, password: str = "user-pw") -> dict:
+    resp = client.post("/auth/register", json={"userName": user_name, "password": password})
+    assert resp.status_code == 200, resp.get_json()
+    return {"Authorization": f"Bearer {resp.get_json()['token']}"}
+
+
+def initiate_loan(client, user_name: str, bank_id: str, metadata_json: str = '{"amount": 1000}',
+                  user_password: str = "user-pw", bank_password: str = "bank-pw") -> str:
+    resp = client.post("/loan/initiate", json={
+        "userName": user_name, "bankId": bank_id, "metadataJson": metadata_json,
+        "userPassword": user_password, "bankPassword": bank_password,
+    })
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()["loanId"]
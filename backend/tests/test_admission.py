@@ -0,0 +1,44 @@
+import pytest
+
+from utils.admission import admission_stats
+
+LOGIN = {"userName": "alice", "password": "wrong"}
+
+@pytest.fixture
+def limited_app(make_app):
+    def factory(**overrides):
+        return make_app(ADMISSION_ENABLED=True, ADMISSION_RATE_PER_SEC=0.001, ADMISSION_BURST=1, **overrides)
+    return factory
+
+def _login(client, forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+    return client.post("/auth/login", json=LOGIN, headers=headers).status_code
+
+def test_clients_behind_a_trusted_proxy_get_their_own_bucket(limited_app):
+    client = limited_app(TRUSTED_PROXY_HOPS=1).test_client()
+
+    assert _login(client, "203.0.113.1") == 401
+    assert _login(client, "203.0.113.2") == 401
+    assert _login(client, "203.0.113.1") == 429
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(limited_app):
+    client = limited_app().test_client()
+
+    assert _login(client, "203.0.113.1") == 401
+    assert _login(client, "203.0.113.2") == 429
+
+def test_only_the_trusted_hop_is_used(limited_app):
+    # the left-most entry comes from the client and can be anything
+    client = limited_app(TRUSTED_PROXY_HOPS=1).test_client()
+
+    assert _login(client, "198.51.100.7, 203.0.113.1") == 401
+    assert _login(client, "198.51.100.8, 203.0.113.1") == 429
+
+def test_rotation_has_its_own_class(limited_app):
+    app = limited_app()
+    resp = app.test_client().post("/auth/rotate-password", json={"userName": "alice", "password": "a", "newPassword": "b"})
+
+    assert resp.status_code == 401  # unknown user, but admitted first
+    stats = admission_stats(app)
+    assert stats["rotation"]["admitted"] == 1
+    assert stats["crypto"]["admitted"] == 0
@@ -0,0 +1,93 @@
+import datetime
+import hashlib
+import json
+import zlib
+
+import pytest
+
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from models.archived_loan import ArchivedLoan
+from models.block import Block
+from utils.sharding import loan_shard
+
+METADATA = '{"amount": 1000}'
+
+@pytest.fixture
+def archived(make_app):
+    """closed, completed and open loans on two shards, after `flask archive-loans`."""
+    app = make_app(shards=2)
+    client = app.test_client()
+    register_user(client, "alice")
+    headers = register_bank(client, "hdfc")
+    loans = {name: initiate_loan(client, "alice", "hdfc", METADATA) for name in ("closed", "completed", "open")}
+    for name, statuses in (("closed", ["accepted", "completed", "closed"]), ("completed", ["accepted", "completed"])):
+        for status in statuses:
+            resp = client.post(f"/loan/{loans[name]}/transition", json={"status": status}, headers=headers)
+            assert resp.status_code == 200
+    result = app.test_cli_runner().invoke(args=["archive-loans", "--min-age-days", "0"])
+    assert result.exit_code == 0, result.output
+    assert "Archived 1 loans" in result.output
+    return app, client, headers, loans
+
+def _statuses(blocks):
+    return [b["transaction"] for b in blocks]
+
+def test_only_closed_loans_leave_the_live_table(archived):
+    app, client, headers, loans = archived
+
+    assert client.get(f"/loan/{loans['closed']}").get_json() == []
+    assert _statuses(client.get(f"/loan/{loans['completed']}").get_json()) == ["initiated", "accepted", "completed"]
+    # a completed loan is not final: the bank can still close it
+    assert client.post(f"/loan/{loans['completed']}/close", headers=headers).status_code == 200
+
+def test_archived_chain_is_served_with_include_archived(archived):
+    app, client, _, loans = archived
+    loan_id = loans["closed"]
+
+    chain = client.get(f"/loan/{loan_id}", query_string={"includeArchived": "1"}).get_json()
+    full = client.get("/loan/full-chain", query_string={"includeArchived": "1"}).get_json()
+    summary = client.get(f"/loan/{loan_id}/archive").get_json()
+
+    assert _statuses(chain) == ["initiated", "accepted", "completed", "closed"]
+    assert [b for b in full if b["loanId"] == loan_id] == chain
+    assert {b["loanId"] for b in client.get("/loan/full-chain").get_json()} == {loans["completed"], loans["open"]}
+    assert (summary["verified"], summary["height"], summary["finalStatus"]) == (True, 4, "closed")
+
+def test_metadata_decrypts_from_the_archived_genesis(archived):
+    app, client, _, loans = archived
+
+    resp = client.post(f"/loan/{loans['closed']}/decrypt/for-user", json={"userName": "alice", "password": "user-pw"})
+
+    assert resp.status_code == 200
+    assert json.loads(resp.get_json()["metadata"]) == json.loads(METADATA)
+
+def test_archived_loan_rejects_appends(archived):
+    app, client, headers, loans = archived
+
+    resp = client.post(f"/loan/{loans['closed']}/transition", json={"status": "paid"}, headers=headers)
+
+    assert resp.status_code == 409
+    assert "archived" in resp.get_json()["error"]
+    with app.app_context(), loan_shard(loans["closed"]):
+        assert Block.query.filter_by(loan_id=loans["closed"]).count() == 0
+
+def test_verify_archive_rehash_catches_a_rewritten_block(archived):
+    app, client, _, loans = archived
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["verify-archive", "--rehash"]).exit_code == 0
+
+    with app.app_context(), loan_shard(loans["closed"]):
+        # move the genesis timestamp and fix up the payload digest: the chain
+        # still links, only recomputing the block hash notices
+        archive = db.session.get(ArchivedLoan, loans["closed"])
+        rows = json.loads(zlib.decompress(archive.payload))
+        rows[0][7] = (datetime.datetime.fromisoformat(rows[0][7]) - datetime.timedelta(days=1)).isoformat()
+        archive.payload = zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+        archive.payload_sha256 = hashlib.sha256(archive.payload).hexdigest()
+        db.session.commit()
+
+    assert runner.invoke(args=["verify-archive"]).exit_code == 0
+    result = runner.invoke(args=["verify-archive", "--rehash"])
+    assert result.exit_code == 1
+    assert f"{loans['closed']}: block" in result.output and "hash mismatch" in result.output
@@ -0,0 +1,169 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import services.blockchain_service as blockchain_service
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from models.block import Block
+from models.loan_head import LoanHead
+from services.blockchain_service import ChainConflictError, append_status_block
+from services.chain_integrity_service import detect_forks
+from utils.sharding import loan_shard
+
+@pytest.fixture
+def loan(app, client):
+    register_user(client, "alice")
+    headers = register_bank(client, "hdfc")
+    return initiate_loan(client, "alice", "hdfc"), headers
+
+def _assert_linear(app, loan_id, height):
+    """The loan's blocks form one chain from genesis to the loan_heads tip."""
+    with app.app_context(), loan_shard(loan_id):
+        blocks = Block.query.filter_by(loan_id=loan_id).all()
+        head = db.session.get(LoanHead, loan_id)
+        by_parent = {b.previous_hash: b for b in blocks}
+        assert len(by_parent) == len(blocks) == height  # no two blocks share a parent
+        chain, parent = [], "0" * 64
+        while parent in by_parent:
+            chain.append(by_parent[parent])
+            parent = chain[-1].current_hash
+        assert len(chain) == height
+        assert (head.tip_hash, head.height, head.current_status) == (chain[-1].current_hash, height, chain[-1].transaction_data)
+        assert detect_forks() == []
+        return [b.transaction_data for b in chain]
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_concurrent_appends_to_one_loan_never_fork(make_app, group_commit):
+    app = make_app(GROUP_COMMIT_ENABLED=group_commit)
+    client = app.test_client()
+    register_user(client, "alice")
+    headers = register_bank(client, "hdfc")
+    loan_id = initiate_loan(client, "alice", "hdfc")
+    threads, per_thread, statuses = 8, 5, []
+
+    def worker():
+        c = app.test_client()
+        for _ in range(per_thread):
+            resp = c.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers)
+            statuses.append(resp.status_code)
+
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+    assert statuses == [200] * threads * per_thread
+    _assert_linear(app, loan_id, 1 + threads * per_thread)
+
+def _competing_writer(app, loan_id, status, rounds):
+    """
+    Patch compute_block_hash so that, between an append reading the tip and
+    swapping it, another writer (as if in another worker: no stripe lock)
+    appends `status` to the same loan - `rounds` times.
+    """
+    real = blockchain_service.compute_block_hash
+    state = {"left": rounds, "busy": False}
+
+    def compete():
+        with app.app_context(), loan_shard(loan_id):
+            blockchain_service._write(lambda: blockchain_service._build_status_block(loan_id, status, app.config["APP_HASH_SALT"]))
+
+    def compute_block_hash(*args):
+        if state["left"] and not state["busy"]:
+            state["left"] -= 1
+            state["busy"] = True
+            t = threading.Thread(target=compete)
+            t.start()
+            t.join()
+            state["busy"] = False
+        return real(*args)
+
+    return compute_block_hash
+
+def test_lost_tip_race_is_retried_on_the_new_tip(app, loan, monkeypatch):
+    loan_id, _ = loan
+    monkeypatch.setattr(blockchain_service, "compute_block_hash", _competing_writer(app, loan_id, "unpaid", 1))
+
+    with app.app_context():
+        block = append_status_block(loan_id, "paid")
+
+    assert block.transaction_data == "paid"
+    assert _assert_linear(app, loan_id, 3) == ["initiated", "unpaid", "paid"]
+
+def test_conflict_after_bounded_retries(app, loan, monkeypatch):
+    loan_id, headers = loan
+    app.config["CHAIN_APPEND_RETRIES"] = 3
+    monkeypatch.setattr(blockchain_service, "compute_block_hash", _competing_writer(app, loan_id, "unpaid", 3))
+
+    resp = app.test_client().post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers)
+
+    assert resp.status_code == 409
+    assert resp.headers["Retry-After"] == "1"
+    assert _assert_linear(app, loan_id, 4) == ["initiated", "unpaid", "unpaid", "unpaid"]
+
+def test_second_child_of_a_block_is_rejected(app, loan):
+    loan_id, _ = loan
+    with app.app_context(), loan_shard(loan_id):
+        genesis = Block.query.filter_by(loan_id=loan_id).one()
+        fork = {c.name: getattr(genesis, c.name) for c in Block.__table__.columns if c.name != "id"}
+        fork.update(current_hash="f" * 64)  # same loan_id and previous_hash
+        with pytest.raises(IntegrityError):
+            db.session.execute(Block.__table__.insert(), fork)
+        db.session.rollback()
+
+def test_detect_forks_reports_a_dangling_head(app, loan):
+    loan_id, _ = loan
+    with app.app_context(), loan_shard(loan_id):
+        assert detect_forks() == []
+        db.session.query(LoanHead).filter_by(loan_id=loan_id).update({"tip_hash": "e" * 64})
+        db.session.commit()
+
+        assert detect_forks() == [{"loanId": loan_id, "kind": "dangling-head", "tipHash": "e" * 64}]
+        assert app.test_cli_runner().invoke(args=["detect-forks"]).exit_code == 1
+
+def test_concurrent_appends_to_different_loans_do_not_conflict(app, client, loan, monkeypatch):
+    loan_ids = [loan[0]] + [initiate_loan(client, "alice", "hdfc") for _ in range(5)]
+    real = blockchain_service._build_status_block
+    conflicts = []
+
+    def counting(*args):
+        try:
+            return real(*args)
+        except ChainConflictError:
+            conflicts.append(args[0])
+            raise
+
+    monkeypatch.setattr(blockchain_service, "_build_status_block", counting)
+
+    def worker(loan_id):
+        with app.app_context():
+            for _ in range(5):
+                append_status_block(loan_id, "paid")
+
+    ts = [threading.Thread(target=worker, args=(loan_id,)) for loan_id in loan_ids]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+    assert conflicts == []
+    for loan_id in loan_ids:
+        _assert_linear(app, loan_id, 6)
+
+def test_init_db_warns_about_loans_without_heads(app, loan):
+    loan_id, _ = loan
+    runner = app.test_cli_runner()
+    assert "Warning" not in runner.invoke(args=["init-db"]).output
+
+    with app.app_context(), loan_shard(loan_id):
+        db.session.query(LoanHead).filter_by(loan_id=loan_id).delete()
+        db.session.commit()
+    result = runner.invoke(args=["init-db"])
+
+    assert result.exit_code == 0
+    assert f"loan {loan_id}" in result.output and "rebuild-stats" in result.output
+    assert runner.invoke(args=["rebuild-stats"]).exit_code == 0
+    assert "Warning" not in runner.invoke(args=["init-db"]).output
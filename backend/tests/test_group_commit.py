@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+import services.blockchain_service as blockchain_service
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from models.block import Block
+from models.loan_head import LoanHead
+from models.loan_stats import LoanStatusCount
+from services.blockchain_service import append_status_block
+
+@pytest.fixture
+def grouped_app(make_app):
+    # a wide window so every concurrent append lands in one batch
+    app = make_app(GROUP_COMMIT_ENABLED=True, GROUP_COMMIT_WINDOW_MS=300)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "good")
+    register_bank(client, "bad")
+    loans = {bank: [initiate_loan(client, "alice", bank, bank_password="bank-pw") for _ in range(3)] for bank in ("good", "bad")}
+    return app, loans
+
+def _append_concurrently(app, loan_ids):
+    errors = {}
+
+    def worker(loan_id):
+        with app.app_context():
+            try:
+                append_status_block(loan_id, "paid")
+            except Exception as e:
+                errors[loan_id] = e
+
+    threads = [threading.Thread(target=worker, args=(loan_id,)) for loan_id in loan_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+def test_batch_commits_once(grouped_app):
+    app, loans = grouped_app
+    commits, released_alone = [], []
+
+    def after_execute(conn, cursor, statement, *args):
+        # releasing an item's savepoint must not end the batch transaction
+        if statement.startswith("RELEASE SAVEPOINT") and not conn.connection.dbapi_connection.in_transaction:
+            released_alone.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, "commit", lambda conn: commits.append(1))
+        event.listen(db.engine, "after_cursor_execute", after_execute)
+
+    errors = _append_concurrently(app, loans["good"] + loans["bad"])
+
+    assert errors == {}
+    assert released_alone == []
+    assert len(commits) < 6  # one transaction per batch, not per append
+
+def test_item_failing_after_its_writes_is_rolled_back_alone(grouped_app, monkeypatch):
+    app, loans = grouped_app
+    real = blockchain_service.record_transition
+    with app.app_context():
+        from services.identity_cache_service import get_bank
+        bad_pk = get_bank("bad").id
+
+    def failing_for_bad_bank(bank_pk, *args):
+        # runs after the tip swap and the block insert, like a failed statement would
+        real(bank_pk, *args)
+        if bank_pk == bad_pk:
+            raise RuntimeError("counter update failed")
+
+    monkeypatch.setattr(blockchain_service, "record_transition", failing_for_bad_bank)
+    errors = _append_concurrently(app, loans["good"] + loans["bad"])
+
+    assert sorted(errors) == sorted(loans["bad"])
+    with app.app_context():
+        heads = {h.loan_id: (h.current_status, h.height) for h in db.session.query(LoanHead)}
+        blocks = {loan_id: Block.query.filter_by(loan_id=loan_id).count() for loan_id in heads}
+        counts = {(c.bank_id, c.status): c.count for c in db.session.query(LoanStatusCount)}
+    for loan_id in loans["good"]:
+        assert (heads[loan_id], blocks[loan_id]) == (("paid", 2), 2)
+    for loan_id in loans["bad"]:
+        assert (heads[loan_id], blocks[loan_id]) == (("initiated", 1), 1)
+    assert counts[(bad_pk, "initiated")] == 3
+    assert counts.get((bad_pk, "paid"), 0) == 0
@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+import routes.loan_routes as loan_routes
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from services.blockchain_service import ChainConflictError
+from utils.idempotency import IdempotencyStore, idempotency_stats
+
+LOAN_BODY = {"userName": "alice", "bankId": "hdfc", "metadataJson": '{"amount": 1}',
+             "userPassword": "user-pw", "bankPassword": "bank-pw"}
+
+@pytest.fixture
+def parties(client):
+    register_user(client, "alice")
+    return register_bank(client, "hdfc")
+
+def _count_loans(app):
+    from models.loan_head import LoanHead
+    with app.app_context():
+        return db.session.query(LoanHead).count()
+
+def test_concurrent_duplicates_coalesce_onto_the_original(app, parties, monkeypatch):
+    duplicates = 7
+    real = loan_routes.create_genesis_block
+
+    def held_until_duplicates_wait(**kwargs):
+        # keep the original in flight until every duplicate is waiting on it
+        deadline = time.monotonic() + 10
+        while idempotency_stats(app)["coalesced"] < duplicates and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return real(**kwargs)
+
+    monkeypatch.setattr(loan_routes, "create_genesis_block", held_until_duplicates_wait)
+    responses = []
+
+    def post():
+        resp = app.test_client().post("/loan/initiate", json=LOAN_BODY, headers={"Idempotency-Key": "k1"})
+        responses.append((resp.status_code, resp.get_json()["loanId"], resp.headers.get("Idempotent-Replayed")))
+
+    threads = [threading.Thread(target=post) for _ in range(duplicates + 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert {status for status, _, _ in responses} == {200}
+    assert len({loan_id for _, loan_id, _ in responses}) == 1
+    assert sorted(replayed or "" for _, _, replayed in responses) == [""] + ["true"] * duplicates
+    assert idempotency_stats(app)["coalesced"] == duplicates
+    assert _count_loans(app) == 1
+
+def test_completed_key_replays_the_stored_response(app, client, parties):
+    first = client.post("/loan/initiate", json=LOAN_BODY, headers={"Idempotency-Key": "k1"})
+    again = client.post("/loan/initiate", json=LOAN_BODY, headers={"Idempotency-Key": "k1"})
+
+    assert again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.get_json() == first.get_json()
+    assert _count_loans(app) == 1
+
+def test_key_reused_with_another_body_is_rejected(client, parties):
+    client.post("/loan/initiate", json=LOAN_BODY, headers={"Idempotency-Key": "k1"})
+    resp = client.post("/loan/initiate", json={**LOAN_BODY, "metadataJson": "{}"}, headers={"Idempotency-Key": "k1"})
+    assert resp.status_code == 422
+
+def test_keys_are_scoped_to_the_path(app, client, parties):
+    loan_id = initiate_loan(client, "alice", "hdfc")
+    a = client.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers={**parties, "Idempotency-Key": "k1"})
+    b = client.post("/loan/initiate", json=LOAN_BODY, headers={"Idempotency-Key": "k1"})
+    assert a.status_code == b.status_code == 200
+    assert "Idempotent-Replayed" not in b.headers
+    assert _count_loans(app) == 2
+
+def test_transition_retry_appends_one_block(client, parties):
+    loan_id = initiate_loan(client, "alice", "hdfc")
+    headers = {**parties, "Idempotency-Key": "t1"}
+    for _ in range(3):
+        assert client.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers).status_code == 200
+    assert [b["transaction"] for b in client.get(f"/loan/{loan_id}").get_json()] == ["initiated", "paid"]
+
+def test_retryable_conflict_is_not_stored(client, parties, monkeypatch):
+    loan_id = initiate_loan(client, "alice", "hdfc")
+    headers = {**parties, "Idempotency-Key": "t1"}
+    real = loan_routes.append_status_block
+
+    def lost_race(*args):
+        raise ChainConflictError("tip moved")
+
+    monkeypatch.setattr(loan_routes, "append_status_block", lost_race)
+    conflict = client.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers)
+    assert conflict.status_code == 409
+    assert conflict.headers["Retry-After"] == "1"
+
+    monkeypatch.setattr(loan_routes, "append_status_block", real)
+    retry = client.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers)
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
+
+def test_store_expires_entries_after_ttl():
+    store = IdempotencyStore(ttl=0.05, max_keys=10)
+    entry, owner = store.claim("k", "fp")
+    store.complete("k", entry, 200, b"{}", "application/json")
+    assert store.claim("k", "fp") == (entry, False)
+
+    time.sleep(0.06)
+    _, owner = store.claim("k", "fp")
+    assert owner
+
+def test_store_evicts_least_recently_used_and_releases_waiters():
+    store = IdempotencyStore(ttl=60, max_keys=2)
+    oldest, _ = store.claim("a", "fp")
+    store.claim("b", "fp")
+    store.claim("c", "fp")
+
+    assert oldest.done.is_set()  # a waiter on "a" would not hang
+    assert store.stats()["keys"] == 2
+    _, owner = store.claim("a", "fp")
+    assert owner
+
+@pytest.mark.parametrize("status, retry_after, stored", [
+    (200, False, True), (404, False, True), (409, False, True),
+    (409, True, False), (429, False, False), (500, False, False), (503, True, False),
+])
+def test_store_keeps_only_final_outcomes(status, retry_after, stored):
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    entry, _ = store.claim("k", "fp")
+    store.complete("k", entry, status, b"{}", "application/json", retryable=retry_after)
+
+    _, owner = store.claim("k", "fp")
+    assert owner is not stored
+
+def test_keys_are_scoped_to_the_caller(client, parties):
+    loan_id = initiate_loan(client, "alice", "hdfc")
+    other_bank = register_bank(client, "icici")
+    body = {"status": "paid"}
+
+    owner = client.post(f"/loan/{loan_id}/transition", json=body, headers={**parties, "Idempotency-Key": "t1"})
+    other = client.post(f"/loan/{loan_id}/transition", json=body, headers={**other_bank, "Idempotency-Key": "t1"})
+
+    assert owner.status_code == 200
+    assert other.status_code == 403
+    assert "Idempotent-Replayed" not in other.headers
@@ -0,0 +1,70 @@
+from conftest import register_bank, register_user
+from db import db
+from models.bank import Bank
+from models.user import User
+from services.identity_cache_service import (
+    BankRecord, RedisBackend, UserRecord, get_bank, get_user_by_id, get_user_by_name, list_agents, list_banks,
+)
+from services.password_service import hash_password
+
+def _change_password_elsewhere(app, model, key, attr, new_password):
+    """Update the hash in the database only, as another worker would."""
+    with app.app_context():
+        row = model.query.filter_by(**key).one()
+        setattr(row, attr, hash_password(new_password))
+        db.session.commit()
+
+def test_user_login_checks_the_current_hash_not_the_cached_one(app, client):
+    register_user(client, "alice", "old-pw")
+    with app.app_context():
+        assert get_user_by_name("alice") is not None  # cached
+
+    _change_password_elsewhere(app, User, {"user_name": "alice"}, "password_hash", "new-pw")
+
+    assert client.post("/auth/login", json={"userName": "alice", "password": "old-pw"}).status_code == 401
+    assert client.post("/auth/login", json={"userName": "alice", "password": "new-pw"}).status_code == 200
+
+def test_bank_login_checks_the_current_hash_not_the_cached_one(app, client):
+    register_bank(client, "hdfc", "old-pw")
+    with app.app_context():
+        assert get_bank("hdfc") is not None
+
+    _change_password_elsewhere(app, Bank, {"bank_id": "hdfc"}, "bank_password_hash", "new-pw")
+
+    assert client.post("/banks/login", json={"bankId": "hdfc", "bankPassword": "old-pw"}).status_code == 401
+    assert client.post("/banks/login", json={"bankId": "hdfc", "bankPassword": "new-pw"}).status_code == 200
+
+def test_cached_records_hold_public_fields_only(app, client):
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+    with app.app_context():
+        user, bank = get_user_by_name("alice"), get_bank("hdfc")
+
+    assert user._fields == ("id", "user_name")
+    assert bank._fields == ("id", "bank_id", "bank_name")
+    assert "salt" not in RedisBackend._encode(bank)
+
+def test_entries_in_an_older_layout_are_misses():
+    stale = '{"t": "UserRecord", "row": [1, "alice", "$2b$hash", {"b64": "c2FsdA=="}]}'
+
+    assert RedisBackend._decode(stale) is None
+    assert RedisBackend._decode(RedisBackend._encode(UserRecord(1, "alice"))) == UserRecord(1, "alice")
+    assert RedisBackend._decode(RedisBackend._encode([BankRecord(1, "hdfc", "HDFC")])) == [BankRecord(1, "hdfc", "HDFC")]
+
+def test_generated_parties_show_up_in_cached_lists(app):
+    from services.synthetic_ledger_service import ChainShape, generate_ledger
+    with app.app_context():
+        generate_ledger(1, 1, 1, 0, ChainShape(), kdf_iterations=1000, seed=1, prefix="first")
+        assert (len(list_banks()), len(list_agents())) == (1, 1)  # cached
+
+        generate_ledger(1, 2, 2, 0, ChainShape(), kdf_iterations=1000, seed=2, prefix="second")
+
+        assert (len(list_banks()), len(list_agents())) == (3, 3)
+
+def test_user_lookup_by_primary_key(app, client):
+    register_user(client, "alice")
+    with app.app_context():
+        pk = get_user_by_name("alice").id
+
+        assert get_user_by_id(pk) == UserRecord(pk, "alice")
+        assert get_user_by_id(pk + 1) is None
@@ -0,0 +1,101 @@
+import datetime
+import time
+
+import jwt
+import pytest
+
+import utils.jwt as jwt_utils
+from conftest import register_bank, register_user
+from utils.jwt import TokenCache, jwt_cache_stats, make_jwt
+
+def _token(app, exp_in: datetime.timedelta = datetime.timedelta(hours=1), role: str = "bank"):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {"sub": "hdfc", "role": role, "exp": int((now + exp_in).timestamp())}
+    return jwt.encode(payload, app.config["JWT_SECRET"], algorithm="HS256")
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_cache_drops_entries_once_they_expire(monkeypatch):
+    cache = TokenCache(max_size=4)
+    now = time.time()
+    cache.put(b"token", {"sub": "hdfc", "exp": now + 10})
+    assert cache.get(b"token") == {"sub": "hdfc", "exp": now + 10}
+
+    monkeypatch.setattr(jwt_utils.time, "time", lambda: now + 10)
+
+    assert cache.get(b"token") is None
+    assert cache.stats() == {"size": 0, "maxSize": 4, "hits": 1, "misses": 1}
+
+def test_cache_evicts_the_least_recently_used():
+    cache = TokenCache(max_size=2)
+    exp = time.time() + 60
+    for digest in (b"a", b"b"):
+        cache.put(digest, {"exp": exp})
+    cache.get(b"a")
+    cache.put(b"c", {"exp": exp})
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None and cache.get(b"c") is not None
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Token abc"}, {"Authorization": "Bearer not-a-jwt"}])
+def test_missing_or_malformed_token_is_401(client, headers):
+    register_bank(client, "hdfc")
+
+    assert client.get("/stats/bank/hdfc", headers=headers).status_code == 401
+
+def test_expired_or_foreign_token_is_401(app, client):
+    register_bank(client, "hdfc")
+    expired = _token(app, exp_in=-datetime.timedelta(seconds=5))
+    foreign = jwt.encode({"sub": "hdfc", "role": "bank", "exp": int(time.time()) + 60},
+                         "another-secret-of-at-least-thirty-two-bytes", algorithm="HS256")
+
+    assert client.get("/stats/bank/hdfc", headers=_bearer(expired)).status_code == 401
+    assert client.get("/stats/bank/hdfc", headers=_bearer(foreign)).status_code == 401
+
+def test_wrong_role_is_403(client):
+    register_bank(client, "hdfc")
+    user_headers = register_user(client, "alice")
+
+    resp = client.get("/stats/bank/hdfc", headers=user_headers)
+
+    assert resp.status_code == 403
+    assert resp.get_json()["error"] == "Forbidden"
+
+def _count_decodes(monkeypatch):
+    calls = []
+    real = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    return calls
+
+def test_cache_hits_skip_signature_verification(app, client, monkeypatch):
+    register_bank(client, "hdfc")
+    with app.app_context():
+        token = make_jwt("hdfc", "bank")
+    calls = _count_decodes(monkeypatch)
+
+    for _ in range(3):
+        assert client.get("/stats/bank/hdfc", headers=_bearer(token)).status_code == 200
+
+    assert len(calls) == 1
+    assert jwt_cache_stats(app)["hits"] >= 2
+
+def test_token_past_its_exp_is_verified_again(app, client, monkeypatch):
+    register_bank(client, "hdfc")
+    token = _token(app, exp_in=datetime.timedelta(seconds=30))
+    calls = _count_decodes(monkeypatch)
+    client.get("/stats/bank/hdfc", headers=_bearer(token))
+    client.get("/stats/bank/hdfc", headers=_bearer(token))
+    assert len(calls) == 1
+
+    later = time.time() + 60
+    monkeypatch.setattr(jwt_utils.time, "time", lambda: later)
+    client.get("/stats/bank/hdfc", headers=_bearer(token))
+
+    # the cached claims were dropped, so the token went back to PyJWT
+    assert len(calls) == 2
@@ -0,0 +1,137 @@
+import datetime
+import os
+
+import pytest
+
+import services.key_rotation_service as key_rotation_service
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from models.encrypted_key import EncryptedKey
+from models.key_rotation import KeyRotation
+from services.encryption_service import encrypt_dek_for_party
+from utils.sharding import loan_shard, shard_of
+
+LOANS = 6
+
+@pytest.fixture
+def ledger(make_app):
+    # small batches so every shard needs several of them
+    app = make_app(shards=3, ROTATION_BATCH_SIZE=2)
+    client = app.test_client()
+    register_user(client, "alice", "old-pw")
+    register_bank(client, "hdfc")
+    loan_ids = [initiate_loan(client, "alice", "hdfc", user_password="old-pw") for _ in range(LOANS)]
+    return app, client, loan_ids
+
+def _rotate_user(client, old="old-pw", new="new-pw"):
+    return client.post("/auth/rotate-password", json={"userName": "alice", "password": old, "newPassword": new})
+
+def _decrypts(client, loan_id, password):
+    resp = client.post(f"/loan/{loan_id}/decrypt/for-user", json={"userName": "alice", "password": password})
+    return resp.status_code == 200
+
+def _set_marker(app, heartbeat_age):
+    with app.app_context():
+        from services.identity_cache_service import get_user_by_name
+        at = datetime.datetime.utcnow() - heartbeat_age
+        db.session.add(KeyRotation(party="user", party_id=get_user_by_name("alice").id, started_at=at, heartbeat_at=at))
+        db.session.commit()
+
+def _markers(app):
+    with app.app_context():
+        return db.session.query(KeyRotation).count()
+
+def test_rotation_rewraps_every_shard(ledger):
+    app, client, loan_ids = ledger
+    with app.app_context():
+        assert len({shard_of(loan_id) for loan_id in loan_ids}) > 1
+
+    resp = _rotate_user(client)
+
+    assert resp.status_code == 200
+    assert resp.get_json()["rotated"] == LOANS
+    assert resp.get_json()["failedLoans"] == []
+    for loan_id in loan_ids:
+        assert _decrypts(client, loan_id, "new-pw")
+        assert not _decrypts(client, loan_id, "old-pw")
+    assert client.post("/auth/login", json={"userName": "alice", "password": "new-pw"}).status_code == 200
+    assert _markers(app) == 0
+
+def test_bank_rotation_leaves_the_user_key_alone(ledger):
+    app, client, loan_ids = ledger
+
+    resp = client.post("/banks/rotate-password", json={"bankId": "hdfc", "bankPassword": "bank-pw", "newBankPassword": "bank-pw-2"})
+
+    assert resp.status_code == 200
+    assert resp.get_json()["rotated"] == LOANS
+    resp = client.post(f"/loan/{loan_ids[0]}/decrypt/for-bank", json={"bankId": "hdfc", "bankPassword": "bank-pw-2"})
+    assert resp.status_code == 200
+    assert _decrypts(client, loan_ids[0], "old-pw")
+
+def test_dek_neither_password_opens_is_reported(ledger):
+    app, client, loan_ids = ledger
+    broken = loan_ids[2]
+    with app.app_context(), loan_shard(broken):
+        # as if the loan had been initiated with a mistyped password
+        enc = EncryptedKey.query.filter_by(loan_id=broken).one()
+        enc.dek_cipher_for_user, enc.dek_nonce_for_user = encrypt_dek_for_party(os.urandom(32), os.urandom(32))
+        db.session.commit()
+
+    resp = _rotate_user(client)
+
+    assert resp.status_code == 200
+    summary = resp.get_json()
+    assert (summary["rotated"], summary["failed"], summary["failedLoans"]) == (LOANS - 1, 1, [broken])
+    # the rest of the rotation still went through
+    assert client.post("/auth/login", json={"userName": "alice", "password": "new-pw"}).status_code == 200
+    assert all(_decrypts(client, loan_id, "new-pw") for loan_id in loan_ids if loan_id != broken)
+
+def test_new_loans_wait_while_a_rotation_is_live(ledger):
+    app, client, _ = ledger
+    _set_marker(app, datetime.timedelta(seconds=1))
+
+    resp = client.post("/loan/initiate", json={"userName": "alice", "bankId": "hdfc", "metadataJson": "{}",
+                                               "userPassword": "old-pw", "bankPassword": "bank-pw"})
+
+    assert resp.status_code == 409
+    assert resp.headers["Retry-After"] == "5"
+    assert _rotate_user(client).status_code == 409  # a second rotation of the same user too
+
+def test_stale_marker_is_taken_over(ledger):
+    app, client, loan_ids = ledger
+    stale = datetime.timedelta(seconds=app.config["ROTATION_STALE_AFTER"] + 60)
+    _set_marker(app, stale)
+
+    assert initiate_loan(client, "alice", "hdfc", user_password="old-pw")
+    resp = _rotate_user(client)
+
+    assert resp.status_code == 200
+    assert resp.get_json()["rotated"] == LOANS + 1
+    assert _markers(app) == 0
+
+def test_interrupted_rotation_resumes(ledger, monkeypatch):
+    app, client, loan_ids = ledger
+    real = key_rotation_service._rewrap_dek
+    calls = []
+
+    def crash_on_third(*args):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("worker killed")
+        return real(*args)
+
+    monkeypatch.setattr(key_rotation_service, "_rewrap_dek", crash_on_third)
+    with pytest.raises(RuntimeError):
+        _rotate_user(client)
+    monkeypatch.setattr(key_rotation_service, "_rewrap_dek", real)
+
+    # batches before the crash were committed; the password hash was not swapped
+    done = [loan_id for loan_id in loan_ids if _decrypts(client, loan_id, "new-pw")]
+    assert 1 <= len(done) <= 2
+    assert _markers(app) == 0
+    assert client.post("/auth/login", json={"userName": "alice", "password": "old-pw"}).status_code == 200
+    resp = _rotate_user(client)
+
+    assert resp.status_code == 200
+    assert (resp.get_json()["rotated"], resp.get_json()["skipped"]) == (LOANS - len(done), len(done))
+    assert all(_decrypts(client, loan_id, "new-pw") for loan_id in loan_ids)
@@ -0,0 +1,169 @@
+import datetime
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+from conftest import build_app, dispose, initiate_loan, register_bank, register_user
+from db import db
+
+T0 = datetime.datetime(2025, 1, 1)
+
+# Optional query parameters /loan/search turns into loan_heads filters; the
+# token always adds user_id (user tokens) or bank_id (bank tokens).
+OPTIONAL_FILTERS = {
+    "party": None,  # the other party: bankId for user tokens, userName for bank tokens
+    "agentId": "agent-1",
+    "status": "unpaid",
+    "range": {"from": "2025-01-01T00:00:00", "to": "2025-02-01T00:00:00"},
+    "cursor": "2025-01-15T00:00:00|ffffffffffffffff",
+}
+
+FILTER_COMBINATIONS = [
+    pytest.param(role, combo, id=f"{role}-token+" + "+".join(combo))
+    for role in ("user", "bank")
+    for n in range(len(OPTIONAL_FILTERS) + 1)
+    for combo in itertools.combinations(OPTIONAL_FILTERS, n)
+]
+
+@pytest.fixture(scope="module")
+def search_app(tmp_path_factory):
+    app = build_app(tmp_path_factory.mktemp("search"))
+    client = app.test_client()
+    tokens = {"bank": register_bank(client, "bank-1"), "user": register_user(client, "user-1")}
+    with app.app_context():
+        from models.agent import Agent
+        db.session.add(Agent(agent_id="agent-1", agent_name="Agent One"))
+        db.session.commit()
+    initiate_loan(client, "user-1", "bank-1")
+    yield app, client, tokens
+    dispose(app)
+
+def _explain_search(app, client, headers, params):
+    """Run /loan/search and return the query plan of its loan_heads query."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM loan_heads" in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            resp = client.get("/loan/search", query_string=params, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        assert resp.status_code == 200, resp.get_json()
+        assert len(statements) == 1
+        statement, parameters = statements[0]
+        with engine.connect() as conn:
+            return [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+@pytest.mark.parametrize("role, combo", FILTER_COMBINATIONS)
+def test_every_search_filter_combination_uses_a_loan_heads_index(search_app, role, combo):
+    app, client, tokens = search_app
+    params = {}
+    for name in combo:
+        if name == "party":
+            params["bankId" if role == "user" else "userName"] = "bank-1" if role == "user" else "user-1"
+        elif name == "range":
+            params.update(OPTIONAL_FILTERS["range"])
+        else:
+            params[name] = OPTIONAL_FILTERS[name]
+
+    plan = _explain_search(app, client, tokens[role], params)
+
+    assert any("INDEX ix_loan_heads_" in line for line in plan), plan
+    assert not any(line.startswith("SCAN loan_heads") for line in plan), plan
+    # the index order serves ORDER BY initiated_at DESC, loan_id DESC
+    assert not any("TEMP B-TREE" in line for line in plan), plan
+
+@pytest.mark.parametrize("role, params, index", [
+    ("user", {"status": "unpaid"}, "ix_loan_heads_user_status_time"),
+    ("user", {}, "ix_loan_heads_user_time"),
+    ("bank", {"status": "unpaid"}, "ix_loan_heads_bank_status_time"),
+    ("bank", {"from": "2025-01-01T00:00:00"}, "ix_loan_heads_bank_time"),
+])
+def test_search_picks_the_most_selective_index(search_app, role, params, index):
+    app, client, tokens = search_app
+    plan = _explain_search(app, client, tokens[role], params)
+    assert any(f"INDEX {index} " in line for line in plan), plan
+
+def test_agent_index_is_picked_for_a_busy_bank_once_analyzed(make_app):
+    # bank_time and agent_time cost the same without statistics, and SQLite
+    # then picks whichever index was created first
+    app = make_app()
+    client = app.test_client()
+    headers = register_bank(client, "bank-1")
+    register_user(client, "user-1")
+    _insert_heads(app, 200)
+    with app.app_context():
+        from models.agent import Agent
+        from models.loan_head import LoanHead
+        db.session.add(Agent(agent_id="agent-1", agent_name="Agent One"))
+        db.session.flush()
+        db.session.query(LoanHead).filter(LoanHead.loan_id < "loan-00002").update({"agent_id": 1})
+        db.session.commit()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+    plan = _explain_search(app, client, headers, {"agentId": "agent-1", "from": "2025-01-01T00:00:00"})
+
+    assert any("INDEX ix_loan_heads_agent_time " in line for line in plan), plan
+
+def _insert_heads(app, count, bank_pk=1, start=0):
+    """loan_heads rows with four loans per initiated_at second, so pages split ties."""
+    from models.loan_head import LoanHead
+    from utils.sharding import loan_shard
+    ids = []
+    with app.app_context():
+        for i in range(start, start + count):
+            loan_id = f"loan-{i:05d}"
+            initiated = T0 + datetime.timedelta(seconds=i // 4)
+            with loan_shard(loan_id):
+                db.session.add(LoanHead(loan_id=loan_id, user_id=1, bank_id=bank_pk, agent_id=None,
+                                        current_status=("paid", "unpaid")[i % 2], tip_hash="0" * 64,
+                                        height=1, initiated_at=initiated, updated_at=initiated))
+                db.session.commit()
+            ids.append((initiated, loan_id))
+    return ids
+
+def _page_through(app, limit, inserted_between_pages=None, **filters):
+    from services.loan_search_service import search_loans
+    seen, cursor, pages = [], None, 0
+    with app.app_context():
+        while pages < 1000:  # a cursor that stops advancing fails instead of hanging
+            rows, cursor = search_loans(cursor=cursor, limit=limit, **filters)
+            seen += [r.loan_id for r in rows]
+            pages += 1
+            if pages == 2 and inserted_between_pages:
+                inserted_between_pages()
+            if cursor is None:
+                return seen
+    pytest.fail(f"pagination did not finish: {len(seen)} rows in {pages} pages")
+
+@pytest.mark.parametrize("shards", [1, 3])
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_keyset_pagination_has_no_duplicates_or_gaps(make_app, shards, limit):
+    app = make_app(shards=shards)
+    expected = [loan_id for _, loan_id in sorted(_insert_heads(app, 41), reverse=True)]
+
+    assert _page_through(app, limit, bank_id=1) == expected
+
+@pytest.mark.parametrize("shards", [1, 3])
+def test_keyset_pagination_with_status_filter(make_app, shards):
+    app = make_app(shards=shards)
+    heads = _insert_heads(app, 41)
+    expected = [loan_id for _, loan_id in sorted(heads, reverse=True) if int(loan_id[-5:]) % 2 == 1]
+
+    assert _page_through(app, 4, bank_id=1, status="unpaid") == expected
+
+def test_keyset_pagination_is_stable_under_concurrent_inserts(make_app):
+    app = make_app(shards=2)
+    expected = [loan_id for _, loan_id in sorted(_insert_heads(app, 30), reverse=True)]
+
+    # newer loans land before the cursor and must not shift later pages
+    seen = _page_through(app, 5, inserted_between_pages=lambda: _insert_heads(app, 8, start=1000), bank_id=1)
+
+    assert seen == expected
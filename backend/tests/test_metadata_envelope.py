@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from conftest import initiate_loan, register_bank, register_user
+from models.block import Block
+from services.encryption_service import decrypt_json_with_dek, encrypt_json_with_dek
+from utils.sharding import loan_shard
+
+SMALL = json.dumps({"amount": 1000})
+LARGE = json.dumps({"amount": 1000, "notes": ["repayment schedule entry"] * 100})
+
+def _genesis_cipher(app, loan_id):
+    with app.app_context(), loan_shard(loan_id):
+        return Block.query.filter_by(loan_id=loan_id, transaction_data="initiated").one().metadata_ciphertext
+
+def _decrypt(client, loan_id):
+    resp = client.post(f"/loan/{loan_id}/decrypt/for-user", json={"userName": "alice", "password": "user-pw"})
+    assert resp.status_code == 200
+    return resp.get_json()["metadata"]
+
+def test_legacy_v1_loans_still_decrypt(make_app):
+    # loans written before the v2 envelope existed
+    app = make_app(METADATA_CODEC="none")
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+    legacy = initiate_loan(client, "alice", "hdfc", LARGE)
+    assert not _genesis_cipher(app, legacy).startswith("v2:")
+
+    app.config["METADATA_CODEC"] = "zlib"
+    current = initiate_loan(client, "alice", "hdfc", LARGE)
+
+    assert _genesis_cipher(app, current).startswith("v2:zlib:")
+    assert _decrypt(client, legacy) == LARGE
+    assert _decrypt(client, current) == LARGE
+
+def test_payloads_under_the_threshold_are_stored_raw(make_app):
+    app = make_app(METADATA_COMPRESS_MIN_SIZE=len(SMALL) + 1)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+
+    small, large = initiate_loan(client, "alice", "hdfc", SMALL), initiate_loan(client, "alice", "hdfc", LARGE)
+
+    assert _genesis_cipher(app, small).startswith("v2:raw:")
+    assert _genesis_cipher(app, large).startswith("v2:zlib:")
+    assert _decrypt(client, small) == SMALL
+
+@pytest.mark.parametrize("codec", ["raw", "zstd"])
+def test_swapped_codec_label_fails_authentication(codec):
+    dek = os.urandom(32)
+    cipher, nonce = encrypt_json_with_dek(LARGE, dek, codec="zlib")
+    assert cipher.startswith("v2:zlib:")
+
+    with pytest.raises(InvalidTag):
+        decrypt_json_with_dek(cipher.replace("v2:zlib:", f"v2:{codec}:", 1), nonce, dek)
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from conftest import initiate_loan, register_bank, register_user
+from db import db
+from models.bank import Bank
+from models.block import Block
+from utils.sharding import shard_indexes, shard_of, use_shard
+
+SHARDS = 3
+
+@pytest.fixture
+def ledger(make_app):
+    """Loans of one user and bank until every one of three shards holds some."""
+    app = make_app(shards=SHARDS)
+    client = app.test_client()
+    register_user(client, "alice")
+    headers = register_bank(client, "hdfc")
+    by_shard = {}
+    with app.app_context():
+        while len(by_shard) < SHARDS:
+            loan_id = initiate_loan(client, "alice", "hdfc", json.dumps({"n": len(by_shard)}))
+            by_shard.setdefault(shard_of(loan_id), []).append(loan_id)
+    return app, client, headers, by_shard
+
+def _rows_per_shard(app, loan_id):
+    with app.app_context():
+        counts = []
+        for shard in shard_indexes():
+            with use_shard(shard):
+                counts.append(Block.query.filter_by(loan_id=loan_id).count())
+        return counts
+
+def test_loan_lifecycle_across_shards(ledger):
+    app, client, headers, by_shard = ledger
+    loan_ids = [loan_id for loans in by_shard.values() for loan_id in loans]
+    first = {shard: loans[0] for shard, loans in by_shard.items()}
+
+    for loan_id in loan_ids:
+        assert client.post(f"/loan/{loan_id}/transition", json={"status": "accepted"}, headers=headers).status_code == 200
+    for loan_id in first.values():
+        assert client.post(f"/loan/{loan_id}/close", headers=headers).status_code == 200
+
+    for shard, loan_id in first.items():
+        # every block of a loan lives on its own shard only
+        expected = [0] * SHARDS
+        expected[shard] = 3
+        assert _rows_per_shard(app, loan_id) == expected
+        assert [b["transaction"] for b in client.get(f"/loan/{loan_id}").get_json()] == ["initiated", "accepted", "closed"]
+        resp = client.post(f"/loan/{loan_id}/decrypt/for-user", json={"userName": "alice", "password": "user-pw"})
+        assert resp.status_code == 200
+        assert json.loads(resp.get_json()["metadata"]) == {"n": list(by_shard).index(shard)}
+
+    listed = {r["loanId"]: r["latestStatus"] for r in client.get("/loan/bank/hdfc", headers=headers).get_json()}
+    assert listed == {loan_id: "closed" if loan_id in first.values() else "accepted" for loan_id in loan_ids}
+    stats = client.get("/stats/bank/hdfc", headers=headers).get_json()
+    assert stats["byStatus"] == {"closed": SHARDS, "accepted": len(loan_ids) - SHARDS}
+
+def test_ledger_access_without_a_shard_raises(ledger):
+    app, _, _, _ = ledger
+
+    with app.app_context():
+        with pytest.raises(RuntimeError, match="outside a shard scope"):
+            Block.query.count()
+        db.session.rollback()
+        # identity tables are always on the primary
+        assert Bank.query.count() == 1
+
+def test_block_id_present_on_several_shards_is_ambiguous(ledger):
+    app, client, _, by_shard = ledger
+    # each shard numbers its blocks from 1
+    genesis = {by_shard[shard][0] for shard in by_shard}
+
+    resp = client.get("/loan/block/1")
+
+    assert resp.status_code == 409
+    assert set(resp.get_json()["loanIds"]) == genesis
+    for loan_id in genesis:
+        resp = client.get("/loan/block/1", query_string={"loanId": loan_id})
+        assert resp.status_code == 200
+        assert resp.get_json()["loanId"] == loan_id
@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+import services.blockchain_service as blockchain_service
+import services.stats_service as stats_service
+from conftest import initiate_loan, register_bank, register_user
+from models.loan_stats import LoanStatusCount
+
+@pytest.fixture
+def loan(app, client):
+    register_user(client, "alice")
+    headers = register_bank(client, "hdfc")
+    return initiate_loan(client, "alice", "hdfc"), headers
+
+def _bump_order(monkeypatch, old_status, new_status):
+    calls = []
+    monkeypatch.setattr(stats_service, "_bump", lambda model, key, delta: calls.append((model.__tablename__, key)))
+    stats_service.record_transition(1, old_status, new_status, datetime.datetime(2025, 1, 1))
+    return [(table, key.get("status")) for table, key in calls if table == LoanStatusCount.__tablename__]
+
+def test_opposite_transitions_lock_counters_in_the_same_order(monkeypatch):
+    # paid -> unpaid and unpaid -> paid touch the same two rows; taking them in
+    # transition order would let two writers deadlock on each other
+    assert _bump_order(monkeypatch, "paid", "unpaid") == _bump_order(monkeypatch, "unpaid", "paid")
+
+def test_deadlocked_append_is_retried(app, client, loan, monkeypatch):
+    loan_id, headers = loan
+    real = blockchain_service.record_transition
+    victims = []
+
+    def deadlock_once(*args):
+        if not victims:
+            victims.append(args)
+            raise DBAPIError("UPDATE loan_status_counts", {}, Exception(1213, "Deadlock found when trying to get lock"))
+        return real(*args)
+
+    monkeypatch.setattr(blockchain_service, "record_transition", deadlock_once)
+    resp = client.post(f"/loan/{loan_id}/transition", json={"status": "paid"}, headers=headers)
+
+    assert resp.status_code == 200
+    assert len(victims) == 1
+    assert [b["transaction"] for b in client.get(f"/loan/{loan_id}").get_json()] == ["initiated", "paid"]
+    stats = client.get("/stats/bank/hdfc", headers=headers).get_json()
+    assert stats["byStatus"] == {"paid": 1}
+
+def test_other_database_errors_are_not_retried(app, client, loan, monkeypatch):
+    loan_id, _ = loan
+    calls = []
+
+    def broken(*args):
+        calls.append(args)
+        raise DBAPIError("UPDATE loan_status_counts", {}, Exception(1146, "Table doesn't exist"))
+
+    monkeypatch.setattr(blockchain_service, "record_transition", broken)
+    with app.app_context(), pytest.raises(DBAPIError):
+        blockchain_service.append_status_block(loan_id, "paid")
+    assert len(calls) == 1
+
+def test_global_stats_carry_no_per_bank_counts(client, loan):
+    stats = client.get("/stats/global").get_json()
+
+    assert stats["byStatus"] == {"initiated": 1}
+    assert "byBank" not in stats
@@ -0,0 +1,227 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+import services.blockchain_service as blockchain_service
+from conftest import register_bank, register_user
+from db import db
+from models.metadata_chunk import MetadataChunk
+from services.stream_crypto_service import MANIFEST_PREFIX, iter_decrypted_stream, parse_manifest, store_encrypted_stream
+
+CHUNK = 64
+LOAN = "loan-under-test"
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+def _store(payload: bytes, loan_id: str = LOAN, dek: bytes = None):
+    dek = dek or os.urandom(32)
+    manifest, prefix = store_encrypted_stream(io.BytesIO(payload), loan_id, dek, CHUNK)
+    db.session.commit()
+    return manifest, prefix, dek
+
+def _decrypt(manifest, prefix, dek, loan_id: str = LOAN) -> bytes:
+    return b"".join(iter_decrypted_stream(loan_id, manifest, prefix, dek, page_size=2))
+
+def _chunks(loan_id: str = LOAN):
+    return MetadataChunk.query.filter_by(loan_id=loan_id).order_by(MetadataChunk.seq).all()
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 5 * CHUNK, 5 * CHUNK + 7])
+def test_round_trip(ctx, size):
+    payload = os.urandom(size)
+    manifest, prefix, dek = _store(payload)
+
+    chunks, length, _ = parse_manifest(manifest)
+    assert manifest.startswith(MANIFEST_PREFIX + ":")
+    assert (chunks, length) == (max(1, -(-size // CHUNK)), size)
+    assert len(_chunks()) == chunks
+    assert _decrypt(manifest, prefix, dek) == payload
+
+def test_flipped_ciphertext_bit_fails(ctx):
+    manifest, prefix, dek = _store(os.urandom(3 * CHUNK))
+    chunk = _chunks()[1]
+    chunk.ciphertext = bytes([chunk.ciphertext[0] ^ 1]) + chunk.ciphertext[1:]
+    db.session.commit()
+
+    with pytest.raises(InvalidTag):
+        _decrypt(manifest, prefix, dek)
+
+def test_dropped_final_chunk_fails(ctx):
+    manifest, prefix, dek = _store(os.urandom(3 * CHUNK))
+    db.session.delete(_chunks()[-1])
+    db.session.commit()
+
+    with pytest.raises(ValueError, match="missing"):
+        _decrypt(manifest, prefix, dek)
+
+def test_truncation_with_a_rewritten_manifest_fails(ctx):
+    # even with the manifest rewritten to match, the new final chunk was
+    # sealed without the last-chunk flag
+    manifest, prefix, dek = _store(os.urandom(3 * CHUNK))
+    chunks = _chunks()
+    db.session.delete(chunks[-1])
+    db.session.commit()
+    digest = hashlib.sha256(b"".join(c.ciphertext for c in chunks[:-1])).hexdigest()
+    truncated = f"{MANIFEST_PREFIX}:2:{2 * CHUNK}:{digest}"
+
+    with pytest.raises(InvalidTag):
+        _decrypt(truncated, prefix, dek)
+
+def test_reordered_chunks_fail(ctx):
+    manifest, prefix, dek = _store(os.urandom(3 * CHUNK))
+    first, second = _chunks()[:2]
+    first.ciphertext, second.ciphertext = second.ciphertext, first.ciphertext
+    db.session.commit()
+
+    with pytest.raises(InvalidTag):
+        _decrypt(manifest, prefix, dek)
+
+def test_extra_chunk_fails(ctx):
+    manifest, prefix, dek = _store(os.urandom(2 * CHUNK))
+    db.session.add(MetadataChunk(loan_id=LOAN, seq=2, ciphertext=_chunks()[1].ciphertext))
+    db.session.commit()
+
+    with pytest.raises(ValueError, match="out of sequence"):
+        _decrypt(manifest, prefix, dek)
+
+def test_chunk_from_another_loan_fails(ctx):
+    dek = os.urandom(32)
+    manifest, prefix, _ = _store(os.urandom(2 * CHUNK), dek=dek)
+    # same DEK and nonce prefix, other loan: only the loan_id AAD differs
+    db.session.execute(MetadataChunk.__table__.update().where(MetadataChunk.loan_id == LOAN).values(loan_id="other-loan"))
+    db.session.commit()
+
+    with pytest.raises(InvalidTag):
+        _decrypt(manifest, prefix, dek, loan_id="other-loan")
+
+def test_wrong_manifest_digest_fails(ctx):
+    manifest, prefix, dek = _store(os.urandom(2 * CHUNK))
+    chunks, size, _ = parse_manifest(manifest)
+
+    with pytest.raises(ValueError, match="manifest"):
+        _decrypt(f"{MANIFEST_PREFIX}:{chunks}:{size}:{'0' * 64}", prefix, dek)
+
+STREAM_FIELDS = {"userName": "alice", "bankId": "hdfc", "userPassword": "user-pw", "bankPassword": "bank-pw"}
+
+def _stream_body(payload: bytes, **fields) -> bytes:
+    return json.dumps({**STREAM_FIELDS, **fields}).encode() + b"\n" + payload
+
+def test_streamed_initiation_and_decryption(make_app):
+    app = make_app(METADATA_CHUNK_SIZE=CHUNK)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+    payload = b'{"documents": "' + b"x" * (10 * CHUNK) + b'"}'
+
+    resp = client.post("/loan/initiate/stream", data=_stream_body(payload))
+    assert resp.status_code == 200, resp.get_json()
+    loan_id = resp.get_json()["loanId"]
+
+    genesis = client.get(f"/loan/{loan_id}").get_json()[0]
+    assert genesis["metadata"]["ciphertext"].startswith(MANIFEST_PREFIX + ":")
+    resp = client.post(f"/loan/{loan_id}/decrypt/for-user/stream", json={"userName": "alice", "password": "user-pw"})
+    assert resp.status_code == 200
+    assert resp.data == payload
+    resp = client.post(f"/loan/{loan_id}/decrypt/for-bank", json={"bankId": "hdfc", "bankPassword": "bank-pw"})
+    assert resp.status_code == 409  # chunked metadata is served by /stream only
+
+@pytest.mark.parametrize("body", [
+    b'{"documents": []}',  # no credentials line
+    b'["alice", "hdfc"]\n{}',
+    json.dumps({**STREAM_FIELDS, "pad": "x" * 5000}).encode() + b"\n{}",  # over the preamble limit
+    json.dumps({**STREAM_FIELDS, "bankPassword": ""}).encode() + b"\n{}",
+])
+def test_streamed_initiation_needs_the_credentials_line(make_app, body):
+    app = make_app()
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+
+    resp = client.post("/loan/initiate/stream", data=body, headers={
+        "X-User-Name": "alice", "X-Bank-Id": "hdfc", "X-User-Password": "user-pw", "X-Bank-Password": "bank-pw",
+    })
+
+    assert resp.status_code == 400  # credentials in headers are not read
+
+
+class _RecordingStream(io.BytesIO):
+    def __init__(self, payload, events):
+        super().__init__(payload)
+        self.events = events
+
+    def read(self, size=-1):
+        self.events.append("read")
+        return super().read(size)
+
+def test_wrapping_keys_are_derived_before_the_stream_is_read(make_app, monkeypatch):
+    app = make_app(METADATA_CHUNK_SIZE=CHUNK)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+    events = []
+    real = blockchain_service.kdf_key
+
+    def recording_kdf(*args):
+        events.append("kdf")
+        return real(*args)
+
+    monkeypatch.setattr(blockchain_service, "kdf_key", recording_kdf)
+    with app.test_request_context():
+        from services.identity_cache_service import get_bank, get_user_by_name
+        blockchain_service.create_genesis_block_streaming(
+            get_user_by_name("alice"), get_bank("hdfc"), None, _RecordingStream(os.urandom(3 * CHUNK), events), "user-pw", "bank-pw")
+
+    assert events[:2] == ["kdf", "kdf"]
+    assert events[2:] == ["read"] * (len(events) - 2)
+
+class _ObservedStream(io.BytesIO):
+    """Counts the chunks another connection can see before each read."""
+    def __init__(self, payload, database):
+        super().__init__(payload)
+        self.database = database
+        self.visible = []
+
+    def read(self, size=-1):
+        with sqlite3.connect(self.database) as conn:
+            self.visible.append(conn.execute("SELECT COUNT(*) FROM metadata_chunks").fetchone()[0])
+        return super().read(size)
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_chunks_are_committed_while_the_body_is_read(make_app, group_commit):
+    app = make_app(METADATA_CHUNK_SIZE=CHUNK, GROUP_COMMIT_ENABLED=group_commit)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+
+    with app.test_request_context():
+        from services.identity_cache_service import get_bank, get_user_by_name
+        stream = _ObservedStream(os.urandom(4 * CHUNK), db.engine.url.database)
+        blockchain_service.create_genesis_block_streaming(
+            get_user_by_name("alice"), get_bank("hdfc"), None, stream, "user-pw", "bank-pw")
+
+    # one chunk is read ahead; everything before it is already committed
+    assert stream.visible == [0, 0, 1, 2, 3]
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_failed_streamed_genesis_leaves_no_chunks(make_app, monkeypatch, group_commit):
+    app = make_app(METADATA_CHUNK_SIZE=CHUNK, GROUP_COMMIT_ENABLED=group_commit)
+    client = app.test_client()
+    register_user(client, "alice")
+    register_bank(client, "hdfc")
+
+    def failing_hash(*args):
+        raise RuntimeError("block insert failed")
+
+    monkeypatch.setattr(blockchain_service, "compute_block_hash", failing_hash)
+    with pytest.raises(RuntimeError):
+        client.post("/loan/initiate/stream", data=_stream_body(os.urandom(3 * CHUNK)))
+
+    with app.app_context():
+        assert MetadataChunk.query.count() == 0
@@ -0,0 +1,160 @@
+import math, threading, time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+
+# Endpoint classes guarded by admission control. Cheap chain reads are not
+# decorated, so they keep their latency while crypto-heavy routes are shed.
+#   auth:   bcrypt hash/check (register, login)
+#   crypto: PBKDF2 key derivation (loan initiation, decrypt)
+#   rotation: password rotation, which re-wraps every DEK of the party and
+#             must not take the slots of short crypto requests
+ENDPOINT_CLASSES = ("auth", "crypto", "rotation")
+
+class ConcurrencyLimiter:
+    """
+    At most max_concurrent requests run at once; up to max_queue more wait
+    (for at most queue_timeout seconds). Anything beyond that is rejected.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def acquire(self) -> bool:
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.in_flight += 1
+                self.admitted += 1
+            return True
+
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                return False
+            self.queued += 1
+
+        got = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.queued -= 1
+            if got:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.rejected_timeout += 1
+        return got
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "maxConcurrent": self.max_concurrent,
+                "maxQueue": self.max_queue,
+                "inFlight": self.in_flight,
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "rejectedQueueFull": self.rejected_queue_full,
+                "rejectedTimeout": self.rejected_timeout,
+            }
+
+class RateLimiter:
+    """
+    Per-client token buckets (rate tokens/second, capacity burst). Buckets are
+    kept in a bounded LRU so an address scan cannot grow memory without limit.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, last_refill)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, client: str) -> float:
+        """
+        Consume one token; returns 0 if allowed, else seconds until a token is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                wait = 0.0
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ratePerSec": self.rate, "burst": self.burst, "trackedClients": len(self._buckets), "rateLimited": self.limited}
+
+def _controllers(app):
+    ctl = app.extensions.get("admission")
+    if ctl is None:
+        cfg = app.config
+        ctl = app.extensions.setdefault("admission", {
+            name: (
+                ConcurrencyLimiter(cfg["ADMISSION_MAX_CONCURRENT"][name], cfg["ADMISSION_MAX_QUEUE"][name], cfg["ADMISSION_QUEUE_TIMEOUT"]),
+                RateLimiter(cfg["ADMISSION_RATE_PER_SEC"], cfg["ADMISSION_BURST"])
+            )
+            for name in ENDPOINT_CLASSES
+        })
+    return ctl
+
+def _reject(status: int, message: str, retry_after: float):
+    resp = jsonify({"error": message})
+    resp.status_code = status
+    resp.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+def admission_controlled(endpoint_class: str):
+    """
+    Route decorator: per-client rate limit (429), then a bounded concurrency
+    slot for the endpoint class (503 when the wait queue is full or times out).
+    Clients are keyed on request.remote_addr; set TRUSTED_PROXY_HOPS when
+    running behind a reverse proxy.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            if not app.config["ADMISSION_ENABLED"]:
+                return fn(*args, **kwargs)
+
+            limiter, rate_limiter = _controllers(app)[endpoint_class]
+            wait = rate_limiter.take(request.remote_addr or "unknown")
+            if wait:
+                return _reject(429, "Too many requests", wait)
+
+            if not limiter.acquire():
+                return _reject(503, "Server busy, retry later", app.config["ADMISSION_RETRY_AFTER"])
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
+
+def admission_stats(app) -> dict:
+    return {
+        name: {**limiter.stats(), **rate_limiter.stats()}
+        for name, (limiter, rate_limiter) in _controllers(app).items()
+    }
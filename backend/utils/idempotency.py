@@ -0,0 +1,139 @@
+import hashlib, threading, time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, jsonify, request
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None  # (status, body, mimetype) once completed
+        self.expires_at = None
+
+class IdempotencyStore:
+    """
+    Bounded, TTL'd map of Idempotency-Key -> stored response.
+
+    A key is claimed by the first request; duplicates that arrive while it is
+    still running wait for it and replay its response instead of redoing the
+    work. Retryable outcomes (5xx, 429, or any response carrying Retry-After,
+    such as a 409 for a lost chain-tip race) are not stored, so the next
+    retry runs again. The LRU is capped at max_keys; completed entries expire after ttl.
+    """
+
+    def __init__(self, ttl: float, max_keys: int):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.coalesced = 0
+
+    def claim(self, key, fingerprint: str):
+        """
+        Returns (entry, owner). owner is True if the caller must do the work.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry, False
+            entry = _Entry(fingerprint)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_keys:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.done.set()  # never strand a waiter on an evicted entry
+            return entry, True
+
+    def complete(self, key, entry: _Entry, status: int, body: bytes, mimetype: str, retryable: bool = False):
+        with self._lock:
+            if retryable or status >= 500 or status == 429:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.response = (status, body, mimetype)
+                entry.expires_at = time.monotonic() + self.ttl
+        entry.done.set()
+
+    def abandon(self, key, entry: _Entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._entries), "maxKeys": self.max_keys, "replayed": self.replayed, "coalesced": self.coalesced}
+
+def _store(app) -> IdempotencyStore:
+    store = app.extensions.get("idempotency")
+    if store is None:
+        store = app.extensions.setdefault("idempotency", IdempotencyStore(app.config["IDEMPOTENCY_TTL"], app.config["IDEMPOTENCY_MAX_KEYS"]))
+    return store
+
+def _replay(entry: _Entry) -> Response:
+    status, body, mimetype = entry.response
+    resp = Response(body, status=status, mimetype=mimetype)
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+def idempotent(fn):
+    """
+    Route decorator honouring an optional `Idempotency-Key` header.
+    Keys are scoped to method + path and, behind require_jwt, to the token's
+    subject, so another caller reusing a key never gets the owner's stored
+    response; reusing a key with a different body is rejected with 422.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key_header = request.headers.get("Idempotency-Key")
+        if not key_header:
+            return fn(*args, **kwargs)
+
+        app = current_app._get_current_object()
+        store = _store(app)
+        claims = getattr(g, "jwt_claims", None) or {}
+        key = (request.method, request.path, claims.get("role"), claims.get("sub"), key_header)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        deadline = time.monotonic() + app.config["IDEMPOTENCY_WAIT_TIMEOUT"]
+
+        while True:
+            entry, owner = store.claim(key, fingerprint)
+            if owner:
+                break
+            if entry.fingerprint != fingerprint:
+                return jsonify({"error": "Idempotency-Key reused with a different request body"}), 422
+            if not entry.done.is_set():
+                store.count("coalesced")
+                if not entry.done.wait(max(0.0, deadline - time.monotonic())):
+                    resp = jsonify({"error": "Original request with this Idempotency-Key is still in progress"})
+                    resp.status_code = 409
+                    resp.headers["Retry-After"] = "1"
+                    return resp
+            if entry.response is not None:
+                store.count("replayed")
+                return _replay(entry)
+            # the original failed with a retryable error (or was evicted): try to take over
+
+        try:
+            resp = app.make_response(fn(*args, **kwargs))
+        except Exception:
+            store.abandon(key, entry)
+            raise
+        store.complete(key, entry, resp.status_code, resp.get_data(), resp.mimetype,
+                       retryable="Retry-After" in resp.headers)
+        return resp
+    return wrapper
+
+def idempotency_stats(app) -> dict:
+    return _store(app).stats()
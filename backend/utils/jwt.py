@@ -0,0 +1,104 @@
+import datetime, hashlib, threading, time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, jsonify, request
+
+def make_jwt(subject: str, role: str) -> str:
+    import jwt  # PyJWT, imported lazily to keep start-up cheap
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {
+        "sub": subject,
+        "role": role,
+        "iat": int(now.timestamp()),
+        "exp": int((now + datetime.timedelta(hours=8)).timestamp())
+    }
+    return jwt.encode(payload, current_app.config["JWT_SECRET"], algorithm="HS256")
+
+class TokenCache:
+    """
+    Bounded LRU of already-verified tokens, keyed by SHA-256 of the token.
+    Entries are dropped once their `exp` has passed, so a hit never outlives
+    the token itself.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest: bytes, claims: dict):
+        with self._lock:
+            self._entries[digest] = (claims, claims["exp"])
+            self._entries.move_to_end(digest)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxSize": self.max_size, "hits": self.hits, "misses": self.misses}
+
+def _token_cache(app) -> TokenCache:
+    cache = app.extensions.get("jwt_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("jwt_cache", TokenCache(app.config["JWT_CACHE_SIZE"]))
+    return cache
+
+def decode_jwt(token: str) -> dict:
+    """
+    Verify an HS256 token and return its claims; raises ValueError if invalid.
+    Tokens seen before (and not yet expired) skip signature verification.
+    """
+    app = current_app._get_current_object()
+    cache = _token_cache(app)
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    claims = cache.get(digest)
+    if claims is not None:
+        return claims
+
+    import jwt
+    try:
+        claims = jwt.decode(token, app.config["JWT_SECRET"], algorithms=["HS256"], options={"require": ["exp", "sub", "role"]})
+    except jwt.InvalidTokenError as e:
+        raise ValueError(str(e))
+    cache.put(digest, claims)
+    return claims
+
+def require_jwt(role: str = None):
+    """
+    Route decorator: requires `Authorization: Bearer <token>` (optionally with
+    the given role) and exposes the claims as g.jwt_claims.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get("Authorization", "")
+            if not header.startswith("Bearer "):
+                return jsonify({"error": "Missing bearer token"}), 401
+            try:
+                claims = decode_jwt(header[len("Bearer "):])
+            except ValueError:
+                return jsonify({"error": "Invalid or expired token"}), 401
+            if role and claims.get("role") != role:
+                return jsonify({"error": "Forbidden"}), 403
+            g.jwt_claims = claims
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def jwt_cache_stats(app) -> dict:
+    return _token_cache(app).stats()
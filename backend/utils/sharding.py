@@ -0,0 +1,104 @@
+import contextvars, zlib
+from contextlib import contextmanager
+import sqlalchemy as sa
+from sqlalchemy.sql.util import find_tables
+from flask import current_app
+from flask_sqlalchemy.session import Session
+
+# Identity tables (and key rotation markers) live only on the primary
+# database; every other table is ledger data, partitioned by loan_id across
+# the shards. Shard 0 is the primary (SQLALCHEMY_DATABASE_URI), shard i > 0
+# is the "shard<i>" bind built from LEDGER_SHARD_URIS. With no extra shards
+# everything stays on the primary and none of this has any effect.
+SHARED_TABLES = frozenset({"users", "banks", "agents", "key_rotations"})
+
+_current_shard = contextvars.ContextVar("ledger_shard", default=None)
+
+def shard_count() -> int:
+    return len(current_app.config["LEDGER_SHARD_URIS"]) + 1
+
+def shard_of(loan_id: str) -> int:
+    """Stable loan_id -> shard mapping (changing the shard count needs a data migration)."""
+    n = shard_count()
+    return zlib.crc32(loan_id.encode("utf-8")) % n if n > 1 else 0
+
+def shard_indexes() -> range:
+    return range(shard_count())
+
+def shard_engine(shard: int) -> sa.engine.Engine:
+    from db import db
+    return db.engines[f"shard{shard}" if shard else None]
+
+@contextmanager
+def use_shard(shard: int):
+    """Route ledger statements of this context (thread/greenlet) to one shard."""
+    token = _current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _current_shard.reset(token)
+
+def loan_shard(loan_id: str):
+    return use_shard(shard_of(loan_id))
+
+def current_shard() -> int:
+    shard = _current_shard.get()
+    return 0 if shard is None else shard
+
+def iter_in_shard(shard: int, iterable):
+    """
+    Wrap a lazy iterator (e.g. a streamed response body) so each step runs in
+    the shard's scope without leaking it to the caller between items.
+    """
+    it = iter(iterable)
+    while True:
+        with use_shard(shard):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+def _touches_ledger(mapper, clause) -> bool:
+    tables = []
+    if mapper is not None:
+        tables.append(sa.inspect(mapper).local_table)
+    if clause is not None:
+        tables.extend(find_tables(clause, include_crud=True))
+    return any(isinstance(t, sa.Table) and t.name not in SHARED_TABLES for t in tables)
+
+class ShardedSession(Session):
+    """
+    db.session class: ledger statements go to the shard selected with
+    use_shard()/loan_shard(), identity tables to the primary. Ledger access
+    with no shard selected is an error once more than one shard is configured,
+    so a missed call site fails loudly instead of reading the wrong database.
+    A session may hold connections to several shards; keep ORM loads of
+    ledger rows within one shard per session (primary keys repeat across
+    shards), and read across shards with Core through an explicit bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shard_count() > 1 and _touches_ledger(mapper, clause):
+            shard = _current_shard.get()
+            if shard is None:
+                raise RuntimeError("ledger table accessed outside a shard scope (see utils/sharding.py)")
+            return shard_engine(shard)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def create_ledger_tables(shard: int):
+    """
+    Create the ledger tables on a shard other than the primary. Foreign keys
+    to the identity tables are left out: those tables exist only on the primary.
+    """
+    from sqlalchemy.schema import CreateIndex, CreateTable
+    from db import db
+    engine = shard_engine(shard)
+    existing = set(sa.inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name in SHARED_TABLES or table.name in existing:
+                continue
+            conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index))
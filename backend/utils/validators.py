@@ -0,0 +1,2 @@
+# Statuses a loan may be moved to via /loan/<loan_id>/transition
+VALID_TRANSITION_STATUSES = {"accepted", "paid", "unpaid", "completed", "closed"}
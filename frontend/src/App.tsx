@@ -15,14 +15,14 @@ import BankDashboard from './components/Bank/BankDashboard';
 
 // --- Auth Helper Functions ---
 
-// Check for EITHER user token ('token') OR bank token ('bank_logged_in' is set to 'token')
+// Check for EITHER a user or a bank JWT in 'token'; 'role' tells them apart
 const getAuthStatus = () => !!localStorage.getItem('token'); 
 const getUserName = () => localStorage.getItem('userName') || '';
 
 // NEW: Check for Bank Specific Session Keys
 const getBankId = () => localStorage.getItem('bankId') || null;
 const getBankName = () => localStorage.getItem('userName') || null; // Banks also use 'userName' for display
-const isBankLoggedIn = () => localStorage.getItem('token') === 'bank_logged_in';
+const isBankLoggedIn = () => !!localStorage.getItem('token') && localStorage.getItem('role') === 'bank';
 
 // --- Main App Component ---
 
@@ -43,6 +43,7 @@ export default function App() {
     localStorage.removeItem('token');
     localStorage.removeItem('userName');
     localStorage.removeItem('bankId');
+    localStorage.removeItem('role');
     
     // Reset all states
     setIsLoggedIn(false);
@@ -84,6 +85,7 @@ function AppContent({
     const newUserName = getUserName();
     // Ensure bank keys are cleared if a user logs in (optional safety measure)
     localStorage.removeItem('bankId'); 
+    localStorage.removeItem('role');
     
     setIsLoggedIn(true);
     setUserName(newUserName);
@@ -94,7 +96,7 @@ function AppContent({
   
   // 2. Bank Login Success (Uses the simplified logic from the previous answer)
   const handleBankLoginSuccess = (name: string, id: string) => {
-    // Note: BankLogin already sets localStorage.setItem('token', 'bank_logged_in');
+    // Note: BankLogin already stores the bank JWT in 'token', sets 'role' to 'bank'
     // and localStorage.setItem('userName', bankName);
     localStorage.setItem('bankId', id);
 
@@ -4,6 +4,7 @@ export const registerUser = async (userName: string, password: string) => {
   const { data } = await api.post('/auth/register', { userName, password });
   localStorage.setItem('token', data.token);
   localStorage.setItem('userName', userName);
+  localStorage.removeItem('role');
   return data;
 };
 
@@ -11,5 +12,6 @@ export const loginUser = async (userName: string, password: string) => {
   const { data } = await api.post('/auth/login', { userName, password });
   localStorage.setItem('token', data.token);
   localStorage.setItem('userName', userName);
+  localStorage.removeItem('role');
   return data;
 };
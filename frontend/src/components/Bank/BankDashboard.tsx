@@ -19,6 +19,9 @@ type Status = "accepted" | "paid" | "unpaid" | "completed" | "closed";
 
 const API_BASE_URL = 'http://localhost:5000';
 
+// Bank-only endpoints require the bank JWT issued by /banks/login
+const authHeaders = () => ({ headers: { Authorization: `Bearer ${localStorage.getItem('token')}` } });
+
 // Updated Props: takes bankName and bankId directly
 interface BankDashboardProps {
     bankName: string;
@@ -44,7 +47,7 @@ const BankDashboard: React.FC<BankDashboardProps> = ({ bankName, bankId, onLogou
         setLoading(true);
         try {
             // Use the bankId prop
-            const response = await axios.get<Loan[]>(`${API_BASE_URL}/loan/bank/${bankId}`);
+            const response = await axios.get<Loan[]>(`${API_BASE_URL}/loan/bank/${bankId}`, authHeaders());
             setLoans(response.data.filter(loan => loan && loan.loanId));
             setMessage(null);
         } catch (err: any) {
@@ -72,7 +75,7 @@ const BankDashboard: React.FC<BankDashboardProps> = ({ bankName, bankId, onLogou
                 ? { bankId: bankId } // Use the bankId prop
                 : { status: status };
 
-            const response = await axios.post(endpoint, payload);
+            const response = await axios.post(endpoint, payload, authHeaders());
 
             setMessage({ 
                 type: 'success', 
@@ -32,12 +32,13 @@ export const BankLogin: React.FC<BankLoginProps> = ({ onDone }) => {
                 bankPassword,
             });
 
-            const { bankId: loggedInBankId, bankName: loggedInBankName } = response.data;
+            const { bankId: loggedInBankId, bankName: loggedInBankName, token } = response.data;
 
             // Store login info locally (using existing generic keys)
             localStorage.setItem('bankId', loggedInBankId); // Store bankId separately for the dashboard
             localStorage.setItem('userName', loggedInBankName);
-            localStorage.setItem('token', 'bank_logged_in'); 
+            localStorage.setItem('token', token); // bank JWT, required by /loan/bank and /loan/<id>/close
+            localStorage.setItem('role', 'bank'); // marks the token as a bank session (see isBankLoggedIn)
             
             // Call the success handler, passing the necessary login info
             onDone(loggedInBankName, loggedInBankId); 